@@ -0,0 +1,98 @@
+# Added Oct 2026 to give the job handler deployments a signal to autoscale from
+#   The arrival rate for each queue is counted from our accepted enqueues,
+#   and the service time from the rq job timings that we get when callbacks arrive.
+
+import os
+from math import ceil
+from time import time
+from typing import Dict, Any, Optional
+
+# NOTE: We use StrictRedis() because we don't need the backwards compatibility of Redis()
+from redis import StrictRedis
+
+
+ARRIVAL_WINDOW_MINUTES = int(os.getenv('CAPACITY_WINDOW_MINUTES', '15')) # Arrival rate is averaged over this
+SERVICE_TIME_HISTORY_LENGTH = 50 # Number of recent job service times kept for each queue
+DEFAULT_SERVICE_SECONDS = float(os.getenv('DEFAULT_SERVICE_SECONDS', '60')) # Used until we've measured some jobs
+# NOTE: The service times can only be measured if rq still has the job when the callback arrives
+#           (finished jobs are only kept for result_ttl, 500s by default)
+#           so jobs whose callback comes long after they finish (e.g., for the largest repos) are missed
+#           -- this biases the average service time (and so the recommended worker count) low under heavy load.
+TARGET_UTILIZATION = float(os.getenv('TARGET_WORKER_UTILIZATION', '0.7')) # Leave some headroom for bursts
+TARGET_DRAIN_SECONDS = float(os.getenv('TARGET_DRAIN_SECONDS', '300')) # How quickly any backlog should be cleared
+MIN_RECOMMENDED_WORKERS = int(os.getenv('MIN_RECOMMENDED_WORKERS', '1'))
+
+
+def record_arrival(redis_connection:StrictRedis, key_prefix:str, queue_name:str) -> None:
+    """
+    Count a job that we've queued (in a per-minute bucket that expires).
+    """
+    arrivals_key = f'{key_prefix}arrivals:{queue_name}:{int(time() // 60)}'
+    pipeline = redis_connection.pipeline()
+    pipeline.incr(arrivals_key)
+    pipeline.expire(arrivals_key, (ARRIVAL_WINDOW_MINUTES + 2) * 60)
+    pipeline.execute()
+# end of record_arrival function
+
+
+def record_service_time(redis_connection:StrictRedis, key_prefix:str, queue_name:str, service_seconds:float) -> None:
+    """
+    Add to the recent service times (how long a worker took to run a job) for the queue.
+    """
+    service_times_key = f'{key_prefix}service_times:{queue_name}'
+    pipeline = redis_connection.pipeline()
+    pipeline.lpush(service_times_key, round(service_seconds, 3))
+    pipeline.ltrim(service_times_key, 0, SERVICE_TIME_HISTORY_LENGTH - 1)
+    pipeline.execute()
+# end of record_service_time function
+
+
+def get_capacity_estimate(arrivals_per_minute:float, service_seconds:float, queue_length:int, worker_count:int) -> Dict[str,Any]:
+    """
+    Estimates how many workers are needed to keep up with the arrivals
+        (at TARGET_UTILIZATION) and also clear the current backlog within TARGET_DRAIN_SECONDS.
+
+    Also predicts how long the current workers will take to drain the queue
+        (None if they can't keep up).
+    """
+    arrivals_per_second = arrivals_per_minute / 60
+    busy_workers = arrivals_per_second * service_seconds # i.e., the offered load
+    backlog_workers = queue_length * service_seconds / TARGET_DRAIN_SECONDS
+    recommended_worker_count = max(ceil(busy_workers / TARGET_UTILIZATION + backlog_workers), MIN_RECOMMENDED_WORKERS)
+
+    drain_seconds:Optional[float]
+    if queue_length == 0:
+        drain_seconds = 0
+    else:
+        spare_jobs_per_second = worker_count / service_seconds - arrivals_per_second
+        drain_seconds = round(queue_length / spare_jobs_per_second, 1) if spare_jobs_per_second > 0 else None
+
+    return {'arrivals_per_minute': round(arrivals_per_minute, 3),
+            'service_seconds': round(service_seconds, 1),
+            'queue_length': queue_length,
+            'worker_count': worker_count,
+            'utilization': round(busy_workers / worker_count, 3) if worker_count else None,
+            'recommended_worker_count': recommended_worker_count,
+            'drain_seconds': drain_seconds,
+            }
+# end of get_capacity_estimate function
+
+
+def get_queue_capacity(redis_connection:StrictRedis, key_prefix:str, queue_name:str, queue_length:int, worker_count:int) -> Dict[str,Any]:
+    """
+    Looks up the recent arrivals and service times for the queue
+        and returns the capacity estimate.
+    """
+    current_minute = int(time() // 60)
+    pipeline = redis_connection.pipeline()
+    # NOTE: The current minute is incomplete, so we use the previous whole minutes
+    pipeline.mget([f'{key_prefix}arrivals:{queue_name}:{minute}'
+                    for minute in range(current_minute - ARRIVAL_WINDOW_MINUTES, current_minute)])
+    pipeline.lrange(f'{key_prefix}service_times:{queue_name}', 0, -1)
+    arrival_counts, service_times = pipeline.execute()
+
+    arrivals_per_minute = sum(int(arrival_count) for arrival_count in arrival_counts if arrival_count) / ARRIVAL_WINDOW_MINUTES
+    service_seconds = sum(float(service_time) for service_time in service_times) / len(service_times) \
+                        if service_times else DEFAULT_SERVICE_SECONDS
+    return get_capacity_estimate(arrivals_per_minute, service_seconds, queue_length, worker_count)
+# end of get_queue_capacity function
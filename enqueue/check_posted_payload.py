@@ -2,7 +2,10 @@
 #   Updated Sept 2018 to add callback check
 
 import os
-from typing import Dict, Tuple, List, Any, Optional
+from fnmatch import fnmatchcase
+from typing import Dict, Tuple, List, Set, Any, Optional
+
+from log_summary import PayloadSummary, TruncatedRepr, get_commit_messages_summary
 
 prefix = os.getenv('QUEUE_PREFIX', '')
 DCS_URL = os.getenv('DCS_URL', default='https://develop.door43.org' if prefix else 'https://git.door43.org')
@@ -14,12 +17,164 @@ UNWANTED_REPO_OWNER_USERNAMES = (  # code repos, not "content", so don't convert
                                 'unfoldingWord-box3',
                                 'unfoldingWord-dev',
                                 )
+# Pushes that only change files matching these (case-insensitive) patterns don't need to be built
+#   NOTE: '*' also matches '/' so '.github/*' includes subfolders
+SKIP_NON_CONTENT_PUSHES = os.getenv('SKIP_NON_CONTENT_PUSHES', 'True').lower() not in ['false', '0', 'f', '']
+NON_CONTENT_PATH_PATTERNS = tuple(pattern.strip().lower() for pattern in
+                                    os.getenv('NON_CONTENT_PATH_PATTERNS',
+                                        'readme,readme.*,license,license.*,.github/*,.gitea/*,'
+                                        '.gitignore,.gitattributes,.editorconfig,.travis.yml').split(',')
+                                    if pattern.strip())
+MAX_PAYLOAD_LENGTH = int(os.getenv('MAX_PAYLOAD_LENGTH', str(10 * 1024 * 1024))) # bytes -- larger webhook bodies are rejected unread
+
+# The X-Gitea-Event types that we accept (and what they must contain)
+#   Others include 'create', 'pull_request'
+VALID_EVENTS:Dict[str,List[Dict[str,Any]]] = {
+    "repository": [
+        {
+            "payload_key": "action",
+            "payload_value": "created",
+            "verbage": "created a repository"
+        },
+        {
+            "payload_key": "action",
+            "payload_value": "deleted",
+            "verbage": "deleted a repository"
+        },
+    ],
+    "push": [
+        {
+            "payload_key": "after",
+            "payload_value": None,
+            "verbage": "push commits",
+        },
+    ],
+    "delete": [
+        {
+            "payload_key": "ref_type",
+            "payload_value": "branch",
+            "verbage": "deleted a branch",
+        },
+        {
+            "payload_key": "ref_type",
+            "payload_value": "tag",
+            "verbage": "deleted a tag",
+        },
+    ],
+    "fork": [
+        {
+            "payload_key": "forkee",
+            "payload_value": None,
+            "verbage": "forked the repo"
+        },
+    ],
+    "release": [
+        {
+            "payload_key": "action",
+            "payload_value": "published",
+            "verbage": "published a release"
+        },
+        {
+            "payload_key": "action",
+            "payload_value": "updated",
+            "verbage": "updated a release"
+        },
+        {
+            "payload_key": "action",
+            "payload_value": "deleted",
+            "verbage": "deleted a release"
+        },
+    ],
+    "pdf_request": [
+        {
+            "payload_key": "after",
+            "payload_value": None,
+            "verbage": "generate a PDF"
+        }
+    ],
+}
+
+
+def check_posted_headers(request) -> Optional[Dict[str,Any]]:
+    """
+    Does a quick check of the webhook request using only the headers and body length,
+        i.e., without parsing the json, so that pings and junk can be rejected
+        before any Redis work is done.
+        Parameter is a rq request object
+
+    Returns None if the request looks ok, else the error dict.
+    """
+    # Bail if this is not a POST with a (reasonable) payload
+    if not request.content_length:
+        return {'error': 'No payload found. You must submit a POST request via a DCS webhook notification.'}
+    if request.content_length > MAX_PAYLOAD_LENGTH:
+        return {'error': f'Payload is too large ({request.content_length:,} bytes).'}
 
+    # Check for a test ping from Nagios
+    if 'nagios-plugins' in request.headers.get('User-Agent', '') \
+    and request.headers.get('X-Gitea-Event') == 'push':
+        return {'error': "This appears to be a Nagios ping for service availability testing."}
+
+    # Bail if this is not from DCS
+    if 'X-Gitea-Event' not in request.headers:
+        return {'error': 'This does not appear to be from DCS.'}
+    event_type = request.headers['X-Gitea-Event']
+    if event_type not in VALID_EVENTS:
+        return {'error': f"X-Gitea-Event '{event_type}' must be an event of type: {', '.join(VALID_EVENTS.keys())}"}
+
+    return None
+# end of check_posted_headers
 
-def check_posted_payload(request, logger) -> Tuple[bool, Dict[str,Any]]:
+
+def get_changed_filepaths(payload_json:Dict[str,Any]) -> Optional[Set[str]]:
+    """
+    Combines the added, modified, and removed files from all the commits of a push.
+
+    Returns None if we can't tell which files were changed,
+        e.g., if a commit doesn't list its files, or if DCS didn't send all the commits.
+    """
+    try:
+        commits = payload_json['commits']
+        if not commits or payload_json.get('total_commits', len(commits)) > len(commits):
+            return None
+        changed_filepaths:Set[str] = set()
+        for commit_dict in commits:
+            if not any(change_key in commit_dict for change_key in ('added', 'modified', 'removed')):
+                return None
+            for change_key in ('added', 'modified', 'removed'):
+                changed_filepaths.update(commit_dict.get(change_key) or [])
+    except (KeyError, AttributeError, TypeError):
+        return None
+    return changed_filepaths
+# end of get_changed_filepaths
+
+
+def has_content_changes(changed_filepaths:Set[str]) -> bool:
+    """
+    Returns True if any of the filepaths might affect the rendered output,
+        i.e., if any doesn't match NON_CONTENT_PATH_PATTERNS.
+    """
+    for filepath in changed_filepaths:
+        lowercase_filepath = filepath.lower()
+        if not any(fnmatchcase(lowercase_filepath, pattern) for pattern in NON_CONTENT_PATH_PATTERNS):
+            return True
+    return False
+# end of has_content_changes
+
+
+def get_default_dcs_url(queue_prefix:str) -> str:
+    """
+    Returns the DCS URL that the repos for the production ('') or dev- queue chain belong to.
+    """
+    return 'https://develop.door43.org' if queue_prefix else 'https://git.door43.org'
+# end of get_default_dcs_url function
+
+
+def check_posted_payload(request, logger, dcs_url:str=DCS_URL) -> Tuple[bool, Dict[str,Any]]:
     """
     Accepts webhook notification from DCS.
         Parameter is a rq request object
+        and the repos must belong to dcs_url (unless RESTRICT_DCS_URL is False)
 
     Returns a 2-tuple:
         True or False if payload checks out
@@ -45,7 +200,9 @@ def check_posted_payload(request, logger) -> Tuple[bool, Dict[str,Any]]:
 
     # Get the json payload and check it
     payload_json = request.get_json()
-    logger.info(f"Webhook payload is {payload_json}")
+    # NOTE: Whole payloads can be hundreds of KB, so we only log a (lazily formatted) summary
+    payload_summary = PayloadSummary(event_type, payload_json, request.data)
+    logger.info("Webhook payload summary: %s", payload_summary)
     # Typical keys are: secret, ref, before, after, compare_url,
     #                               commits, (head_commit), repository, pusher, sender
     # logger.debug("Webhook payload:")
@@ -54,79 +211,15 @@ def check_posted_payload(request, logger) -> Tuple[bool, Dict[str,Any]]:
 
     # Bail if this is not a push, release (tag), or delete (branch) event
     #   Others include 'create', 'pull_request', 'fork'
-    valid_events = {
-        "repository": [
-            {
-                "payload_key": "action",
-                "payload_value": "created",
-                "verbage": "created a repository"
-            },
-            {
-                "payload_key": "action",
-                "payload_value": "deleted",
-                "verbage": "deleted a repository"
-            },
-        ],
-        "push": [
-            {
-                "payload_key": "after",
-                "payload_value": None,
-                "verbage": "push commits",
-            },
-        ],
-        "delete": [
-            {
-                "payload_key": "ref_type",
-                "payload_value": "branch",
-                "verbage": "deleted a branch",
-            },
-            {
-                "payload_key": "ref_type",
-                "payload_value": "tag",
-                "verbage": "deleted a tag",
-            },
-        ],
-        "fork": [
-            {
-                "payload_key": "forkee",
-                "payload_value": None,
-                "verbage": "forked the repo"
-            },
-        ],
-        "release": [
-            {
-                "payload_key": "action",
-                "payload_value": "published",
-                "verbage": "published a release"
-            },
-            {
-                "payload_key": "action",
-                "payload_value": "updated",
-                "verbage": "updated a release"
-            },
-            {
-                "payload_key": "action",
-                "payload_value": "deleted",
-                "verbage": "deleted a release"
-            },
-        ],
-        "pdf_request": [
-            {
-                "payload_key": "after",
-                "payload_value": None,
-                "verbage": "generate a PDF"
-            }
-        ],
-    }
-    if event_type not in valid_events:
-        message = f"X-Gitea-Event '{event_type}' must be an event of type: {', '.join(valid_events.keys())}"
+    if event_type not in VALID_EVENTS:
+        message = f"X-Gitea-Event '{event_type}' must be an event of type: {', '.join(VALID_EVENTS.keys())}"
         logger.error(message)
-        logger.info(f"Ignoring '{event_type}' payload: {payload_json}") # Also shows in prodn logs
+        logger.info("Ignoring '%s' payload: %s", event_type, payload_summary) # Also shows in prodn logs
         return False, {'error': message}
     my_event = None
     payload_keys = []
     payload_values = []
-    for event in valid_events[event_type]:
+    for event in VALID_EVENTS[event_type]:
         payload_keys.append(event["payload_key"])
         if "payload_value" in event and event["payload_value"]:
             payload_values.append(event["payload_value"])
@@ -138,7 +231,7 @@ def check_posted_payload(request, logger) -> Tuple[bool, Dict[str,Any]]:
         if len(payload_values) > 0:
             message += f" and the following values: {', '.join(payload_values)}"
         logger.error(message)
-        logger.info(f"Ignoring '{event_type}' payload: {payload_json}") # Also shows in prodn logs
+        logger.info("Ignoring '%s' payload: %s", event_type, payload_summary) # Also shows in prodn logs
         return False, {'error': message}
     our_event_verbage = my_event["verbage"]
 
@@ -177,22 +270,17 @@ def check_posted_payload(request, logger) -> Tuple[bool, Dict[str,Any]]:
         return False, {'error': f'The repo for {event_type} is not public.'}
 
 
-    commit_messages:List[str] = []
-    commit_message:Optional[str]
     try:
-        # Assemble a string of commit messages
-        for commit_dict in payload_json['commits']:
-            this_commit_message = commit_dict['message'].strip() # Seems to always end with a newline
-            commit_messages.append(f'"{this_commit_message}"')
-        commit_message = ', '.join(commit_messages)
-    except (KeyError, AttributeError, TypeError, IndexError):
-        commit_message = None
+        # Summarise the (first few, truncated) commit messages
+        commit_count = len(payload_json['commits'])
+    except (KeyError, AttributeError, TypeError):
+        commit_count = 0
 
     try:
-        count_info = 'one commit' if len(commit_messages)==1 else f'{len(commit_messages)} commits'
-        extra_info = f" with {count_info}: {commit_message}" if event_type=='push' \
+        count_info = 'one commit' if commit_count==1 else f'{commit_count} commits'
+        extra_info = f" with {count_info}: {get_commit_messages_summary(payload_json)}" if event_type=='push' \
                     else f" with '{payload_json['release']['name']}'"
-    except (KeyError, AttributeError):
+    except (KeyError, AttributeError, TypeError):
         extra_info = ""
     if pusher_username:
         logger.info(f"'{pusher_username}' {our_event_verbage} '{repo_name}'{extra_info}")
@@ -201,13 +289,13 @@ def check_posted_payload(request, logger) -> Tuple[bool, Dict[str,Any]]:
     elif repo_name:
         logger.info(f"UNKNOWN {our_event_verbage} '{repo_name}'{extra_info}")
     else: # they were all None
-        logger.info(f"No pusher/sender/repo name in {event_type} ({our_event_verbage}); payload: {payload_json}")
+        logger.info("No pusher/sender/repo name in %s (%s); payload: %s", event_type, our_event_verbage, payload_summary)
 
     # Bail if the URL to the repo is invalid
     try:
-        if RESTRICT_DCS_URL and not payload_json['repository']['html_url'].startswith(DCS_URL):
-            logger.error(f"The repo for {event_type} at '{payload_json['repository']['html_url']}' does not belong to '{DCS_URL}'")
-            return False, {'error': f'The repo for {event_type} does not belong to {DCS_URL}.'}
+        if RESTRICT_DCS_URL and not payload_json['repository']['html_url'].startswith(dcs_url):
+            logger.error(f"The repo for {event_type} at '{payload_json['repository']['html_url']}' does not belong to '{dcs_url}'")
+            return False, {'error': f'The repo for {event_type} does not belong to {dcs_url}.'}
     except KeyError:
         logger.error("No repo URL specified")
         return False, {'error': f"No repo URL specified for {event_type}."}
@@ -231,6 +319,14 @@ def check_posted_payload(request, logger) -> Tuple[bool, Dict[str,Any]]:
             logger.error("No commits specified for push")
             return False, {'error': "No commits specified for push."}
 
+        # See if the push only changed files that don't affect the rendered output (like README.md)
+        #   If so, flag it so that the downstream queues that only want content changes can be skipped
+        changed_filepaths = get_changed_filepaths(payload_json)
+        if SKIP_NON_CONTENT_PUSHES and changed_filepaths is not None:
+            payload_json['door43_content_changed'] = has_content_changes(changed_filepaths)
+            if not payload_json['door43_content_changed']:
+                logger.info(f"This push only changed non-content files: {', '.join(sorted(changed_filepaths)[:10])}")
+
     if 'action' in payload_json:
         logger.info(f"This {event_type} has ACTION='{payload_json['action']}'")
     if 'release' in payload_json:
@@ -263,7 +359,7 @@ def check_posted_callback_payload(request, logger) -> Tuple[bool, Dict[str,Any]]
 
     # Get the json payload and check it
     callback_payload_json = request.get_json()
-    logger.debug(f"Callback payload is {callback_payload_json}") # Doesn't show in main logs
+    logger.debug("Callback payload is %s", TruncatedRepr(callback_payload_json)) # Doesn't show in main logs
 
     if 'job_id' not in callback_payload_json or not callback_payload_json['job_id']:
         logger.error("No callback job_id specified")
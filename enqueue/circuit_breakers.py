@@ -0,0 +1,197 @@
+# Added Oct 2026 so that slow or failing telemetry backends (statsd/Graphite and AWS CloudWatch)
+#   can't add their latency to the handling of webhooks and callbacks.
+#   While a breaker is open (tripped), the work for that backend is simply dropped.
+
+import os
+import logging
+from time import time, perf_counter
+from threading import Lock
+from typing import Dict, List, Callable, Any, Optional
+
+import watchtower # AWS CloudWatch logging
+from statsd import StatsClient # Graphite front-end
+
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')) # Consecutive errors or slow calls before tripping
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30')) # How long to stay open before probing again
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised (and handled by the caller) instead of making a call while the breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive errors (and calls slower than latency_threshold seconds)
+        and opens (trips) when there are too many.
+
+    When open, calls are shed (not made) until reset_seconds have passed,
+        then one probe call is allowed through (half-open)
+        and its success or failure closes or re-opens the breaker.
+    """
+    def __init__(self, name:str, latency_threshold:float, state_logger:Optional[logging.Logger]=None,
+                    failure_threshold:int=BREAKER_FAILURE_THRESHOLD, reset_seconds:float=BREAKER_RESET_SECONDS) -> None:
+        self.name = name
+        self.latency_threshold = latency_threshold
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state_logger = state_logger # Must not log via anything guarded by this breaker
+        self.state = CLOSED
+        self.failure_count = 0
+        self.opened_at:Optional[float] = None
+        self.trip_count = self.shed_count = 0
+        self.lock = Lock()
+
+    def allow_call(self) -> bool:
+        """
+        Returns True if a call should be made now.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.opened_at is not None \
+            and time() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN # This call is the probe
+                return True
+            self.shed_count += 1
+            return False
+
+    def record_result(self, succeeded:bool, elapsed_seconds:float) -> None:
+        """
+        Update the breaker state after a call has been made.
+        """
+        failed = not succeeded or elapsed_seconds > self.latency_threshold
+        with self.lock:
+            previous_state = self.state
+            if not failed:
+                self.failure_count = 0
+                self.state = CLOSED
+            else:
+                self.failure_count += 1
+                if self.state == HALF_OPEN or self.failure_count >= self.failure_threshold:
+                    if self.state != OPEN:
+                        self.trip_count += 1
+                    self.state = OPEN
+                    self.opened_at = time()
+            new_state = self.state
+        if new_state != previous_state and self.state_logger is not None:
+            self.state_logger.warning(f"'{self.name}' circuit breaker is now {new_state} " \
+                                      f"(after {'a failed' if failed else 'a successful'} call taking {elapsed_seconds:.3f}s)")
+
+    def call(self, function:Callable[...,Any], *args, **kwargs) -> Any:
+        """
+        Calls the function (unless the breaker is open) and records how it went.
+
+        Returns the result of the function, or None if the call was shed or failed.
+        """
+        if not self.allow_call():
+            return None
+        start_time = perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception: # Telemetry failures must never break the request
+            self.record_result(False, perf_counter() - start_time)
+            return None
+        self.record_result(True, perf_counter() - start_time)
+        return result
+
+    def get_state_dict(self) -> Dict[str,Any]:
+        """
+        Returns a dict describing the breaker (e.g., for a status endpoint).
+        """
+        with self.lock:
+            return {'state': self.state,
+                    'failure_count': self.failure_count,
+                    'trip_count': self.trip_count,
+                    'shed_count': self.shed_count,
+                    }
+# end of CircuitBreaker class
+
+
+class GuardedStatsClient:
+    """
+    Provides the StatsClient methods that we use, but guarded by a circuit breaker.
+
+    The StatsClient itself is only created on first use
+        because it looks up the Graphite hostname (which might be slow or fail).
+    """
+    def __init__(self, host:str, port:int, breaker:CircuitBreaker) -> None:
+        self.host, self.port = host, port
+        self.breaker = breaker
+        self.stats_client:Optional[StatsClient] = None
+
+    def _send(self, method_name:str, *args) -> None:
+        def send() -> None:
+            if self.stats_client is None:
+                self.stats_client = StatsClient(host=self.host, port=self.port)
+            getattr(self.stats_client, method_name)(*args)
+        self.breaker.call(send)
+
+    def incr(self, stat:str, count:int=1) -> None:
+        self._send('incr', stat, count)
+
+    def gauge(self, stat:str, value:float) -> None:
+        self._send('gauge', stat, value)
+
+    def timing(self, stat:str, delta:float) -> None:
+        self._send('timing', stat, delta)
+# end of GuardedStatsClient class
+
+
+class GuardedLogsClient:
+    """
+    Wraps a boto3 CloudWatch Logs client so that each put_log_events call
+        (made by the watchtower sending thread) is timed and counted by the circuit breaker.
+
+    While the breaker is open, calls fail immediately (so watchtower's retries don't wait for AWS).
+    """
+    def __init__(self, logs_client:Any, breaker:CircuitBreaker) -> None:
+        self.logs_client = logs_client
+        self.breaker = breaker
+
+    def __getattr__(self, attribute_name:str) -> Any:
+        return getattr(self.logs_client, attribute_name) # e.g., exceptions, create_log_stream
+
+    def put_log_events(self, **kwargs) -> Dict[str,Any]:
+        if self.breaker.state == OPEN:
+            raise CircuitOpenError(f"'{self.breaker.name}' circuit breaker is open")
+        start_time = perf_counter()
+        try:
+            response = self.logs_client.put_log_events(**kwargs)
+        except self.logs_client.exceptions.ClientError as e:
+            # Sequence token and missing log stream errors are normal (watchtower retries them)
+            self.breaker.record_result(isinstance(e, (self.logs_client.exceptions.DataAlreadyAcceptedException,
+                                                      self.logs_client.exceptions.InvalidSequenceTokenException,
+                                                      self.logs_client.exceptions.ResourceNotFoundException)),
+                                        perf_counter() - start_time)
+            raise
+        except Exception:
+            self.breaker.record_result(False, perf_counter() - start_time)
+            raise
+        self.breaker.record_result(True, perf_counter() - start_time)
+        return response
+# end of GuardedLogsClient class
+
+
+class GuardedCloudWatchLogHandler(watchtower.CloudWatchLogHandler):
+    """
+    A watchtower handler whose sending of batches to CloudWatch is guarded by a circuit breaker.
+
+    NOTE: emit() only puts the record on a queue (watchtower sends the batches from a background thread)
+            so it's the sending that has to be guarded.
+          Batches are dropped while the breaker is open.
+    """
+    def __init__(self, breaker:CircuitBreaker, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.breaker = breaker
+        self.cwl_client = GuardedLogsClient(self.cwl_client, breaker)
+
+    def _submit_batch(self, batch:List[Dict[str,Any]], log_stream_name:str, max_retries:int=5) -> None:
+        if batch and not self.breaker.allow_call():
+            return # Dropped
+        super()._submit_batch(batch, log_stream_name, max_retries=max_retries)
+# end of GuardedCloudWatchLogHandler class
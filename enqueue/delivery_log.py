@@ -0,0 +1,84 @@
+# Added Oct 2026 so that recent deliveries can be inspected without digging through CloudWatch
+#   A compact record of each webhook/callback delivery (headers summary, payload digest,
+#   outcome, job ids, and stage timings) is kept in a length-capped Redis list for each route
+#   (so the memory used is fixed, and all the gunicorn workers share the same lists).
+
+import os
+import json
+from time import perf_counter
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+# NOTE: We use StrictRedis() because we don't need the backwards compatibility of Redis()
+from redis import StrictRedis
+
+from log_summary import truncate
+
+
+RECENT_DELIVERIES_LENGTH = int(os.getenv('RECENT_DELIVERIES_LENGTH', '100')) # Per route -- 0 disables the recording
+SUMMARIZED_HEADER_NAMES = ('X-Gitea-Event', 'X-Gitea-Delivery', 'User-Agent', 'Content-Type', 'Content-Length', 'X-Forwarded-For')
+    # NOTE: Deliberately excludes any signature or authorization headers
+
+
+class DeliveryRecord:
+    """
+    Collects the details of one delivery (request) as it's handled.
+    """
+    def __init__(self, route_name:str, headers:Any) -> None:
+        self.route_name = route_name
+        self.received_at = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        self.headers_summary = {header_name:truncate(headers[header_name])
+                                for header_name in SUMMARIZED_HEADER_NAMES if header_name in headers}
+        self.payload_digest:Optional[str] = None
+        self.repo_name:Optional[str] = None
+        self.job_ids:Dict[str,str] = {}
+        self.stage_timings:Dict[str,float] = {} # In milliseconds
+        self.start_time = self.stage_start_time = perf_counter()
+
+    def end_stage(self, stage_name:str) -> None:
+        """
+        Records how long the stage took (since the previous stage ended).
+        """
+        stage_end_time = perf_counter()
+        self.stage_timings[stage_name] = round((stage_end_time - self.stage_start_time) * 1000, 3)
+        self.stage_start_time = stage_end_time
+
+    def get_dict(self, status_code:int, outcome:Optional[str], error:Optional[str]=None) -> Dict[str,Any]:
+        """
+        Returns the (json-serializable) record of the finished delivery.
+        """
+        return {'route': self.route_name,
+                'received_at': self.received_at,
+                'headers': self.headers_summary,
+                'digest': self.payload_digest,
+                'repo': self.repo_name,
+                'status_code': status_code,
+                'outcome': outcome,
+                'error': truncate(str(error)) if error else None,
+                'job_ids': self.job_ids,
+                'stage_ms': self.stage_timings,
+                'total_ms': round((perf_counter() - self.start_time) * 1000, 3),
+                }
+# end of DeliveryRecord class
+
+
+def save_delivery(redis_connection:StrictRedis, key_prefix:str, delivery_dict:Dict[str,Any]) -> None:
+    """
+    Adds the delivery to the front of the list for its route (and trims the oldest off the end).
+    """
+    deliveries_key = f"{key_prefix}deliveries:{delivery_dict['route']}"
+    pipeline = redis_connection.pipeline()
+    pipeline.lpush(deliveries_key, json.dumps(delivery_dict))
+    pipeline.ltrim(deliveries_key, 0, RECENT_DELIVERIES_LENGTH - 1)
+    pipeline.execute()
+# end of save_delivery function
+
+
+def get_recent_deliveries(redis_connection:StrictRedis, key_prefix:str, route_name:str, count:int) -> List[Dict[str,Any]]:
+    """
+    Returns up to count (at least one) of the most recent deliveries for the route (newest first).
+    """
+    count = max(count, 1) # Otherwise LRANGE 0 -1 would return the whole list
+    return [json.loads(delivery_json)
+            for delivery_json in redis_connection.lrange(f'{key_prefix}deliveries:{route_name}', 0, count - 1)]
+# end of get_recent_deliveries function
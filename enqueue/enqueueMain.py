@@ -7,22 +7,35 @@
 # Python imports
 from os import getenv, environ
 import sys
+import hmac
 from datetime import datetime, timedelta
 import logging
+from typing import Dict, List, Tuple, Any, Optional
 import boto3
-import watchtower
 
 # Library (PyPI) imports
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from flask import Flask, request, jsonify, g, has_request_context
+from flask_cors.core import get_cors_options, set_cors_headers
+from watchtower import CloudWatchLogFormatter
 # NOTE: We use StrictRedis() because we don't need the backwards compatibility of Redis()
 from redis import StrictRedis
 from rq import Queue, Worker
-from statsd import StatsClient # Graphite front-end
 
 
 # Local imports
-from check_posted_payload import check_posted_payload, check_posted_callback_payload
+from check_posted_payload import check_posted_headers, check_posted_payload, check_posted_callback_payload, \
+                                    get_default_dcs_url, DCS_URL, VALID_EVENTS
+from redis_shards import RedisShardRing, get_shard_hostnames, REDIS_CONNECTION_ERRORS
+from fanout_targets import load_fanout_table, get_fanout_targets
+from job_timeouts import record_job_callback, get_job_timeout
+from latency_tracker import get_job_ref, record_jobs_enqueued, pop_pending_jobs, get_callback_latencies
+from log_summary import DebugSamplingFilter, get_payload_digest
+from circuit_breakers import CircuitBreaker, GuardedStatsClient, GuardedCloudWatchLogHandler
+from capacity_planner import record_arrival, record_service_time, get_queue_capacity
+from request_profiler import RequestProfiler
+from delivery_log import DeliveryRecord, save_delivery, get_recent_deliveries, RECENT_DELIVERIES_LENGTH
+from queue_backends import get_queue_backend
+from environments import get_environment_path_segment, parse_environment_hostnames, select_environment_prefix
 
 DEV_PREFIX = 'dev-'
 
@@ -36,29 +49,75 @@ DOOR43_JOB_HANDLER_CALLBACK_QUEUE_NAME = 'door43_job_handler_callback'
 #WEBHOOK_URL_SEGMENT = 'client/webhook/'
 WEBHOOK_URL_SEGMENT = '' # Leaving this blank will cause the service to run at '/'
 CALLBACK_URL_SEGMENT = WEBHOOK_URL_SEGMENT + 'tx-callback/'
+HEALTH_URL_SEGMENT = WEBHOOK_URL_SEGMENT + 'health/' # A cheap endpoint for monitors like Nagios
+CAPACITY_URL_SEGMENT = WEBHOOK_URL_SEGMENT + 'capacity/' # Recommended worker counts for autoscaling
+PROFILING_URL_SEGMENT = WEBHOOK_URL_SEGMENT + 'admin/profiling/' # Needs ADMIN_TOKEN
+DELIVERIES_URL_SEGMENT = WEBHOOK_URL_SEGMENT + 'admin/deliveries/' # Needs ADMIN_TOKEN
 
 
 # Look at relevant environment variables
 PREFIX = getenv('QUEUE_PREFIX', '') # Gets (optional) QUEUE_PREFIX environment variable -- set to 'dev-' for development
 PREFIXED_LOGGING_NAME = PREFIX + LOGGING_NAME
-PREFIXED_DOOR43_JOB_HANDLER_QUEUE_NAME = PREFIX + DOOR43_JOB_HANDLER_QUEUE_NAME
-PREFIXED_DOOR43_JOB_HANDLER_CALLBACK_QUEUE_NAME = PREFIX + DOOR43_JOB_HANDLER_CALLBACK_QUEUE_NAME
-PREFIXED_DOOR43_CATALOG_JOB_HANDLER_QUEUE_NAME = PREFIX + DOOR43_CATALOG_JOB_HANDLER_QUEUE_NAME
+# Optionally serve both the production and dev- queue chains from this one process (see environments.py)
+#   Then QUEUE_PREFIX is only the default environment (and decides the logging setup)
+MULTIPLEXED_MODE = getenv('MULTIPLEXED_MODE', 'False').lower() not in ('false', '0', 'f', '')
+SERVED_PREFIXES = list(dict.fromkeys([PREFIX, '', DEV_PREFIX])) if MULTIPLEXED_MODE else [PREFIX]
+# Optionally choose the environment by hostname, e.g., 'dev-api.door43.org=dev-' (else by path, else QUEUE_PREFIX)
+ENVIRONMENT_HOSTNAMES = parse_environment_hostnames(getenv('ENVIRONMENT_HOSTNAMES', ''), SERVED_PREFIXES)
 
 # NOTE: Large lexicons like UGL and UAHL seem to be the longest-running jobs
-WEBHOOK_TIMEOUT = '900s' if PREFIX else '600s' # Then a running job (taken out of the queue) will be considered to have failed
+DEV_WEBHOOK_TIMEOUT, PROD_WEBHOOK_TIMEOUT = '900s', '600s' # Then a running job (taken out of the queue) will be considered to have failed
     # NOTE: This is only the time until webhook.py returns after preprocessing and submitting the job
     #           -- the actual conversion jobs might still be running.
     # RJH: 480s fails on UHB 76,000+ link checks for my slow internet (took 361s)
     # RJH: 480s fails on UGNT 33,000+ link checks for my slow internet (took 596s)
-CALLBACK_TIMEOUT = '1200s' if PREFIX else '600s' # Then a running callback job (taken out of the queue) will be considered to have failed
+DEV_CALLBACK_TIMEOUT, PROD_CALLBACK_TIMEOUT = '1200s', '600s' # Then a running callback job (taken out of the queue) will be considered to have failed
     # RJH: 480s fails on UGL upload for my slow internet (600s fails even on mini UGL upload!!!)
+# NOTE: Fan-out entries with 'adaptive_timeout' use the webhook timeout only until they've seen a few callbacks for the repo
+#           -- after that, the timeout comes from the recent runtimes of that repo (see job_timeouts.py)
+
+# The downstream queues that accepted webhook events get sent to (each queue name gets prefixed for dev)
+#   This can be replaced by setting FANOUT_TABLE_FILEPATH to a JSON file containing a list of similar entries
+#   See fanout_targets.py for the optional filter keys (a missing timeout means the webhook timeout above)
+DEFAULT_WEBHOOK_FANOUT_TABLE:List[Dict[str,Any]] = [
+    {
+        'queue_name': DOOR43_JOB_HANDLER_QUEUE_NAME,
+        'function_name': 'webhook.job', # A function named webhook.job will be called by the worker
+        'stats_name': 'enqueue-job',
+        'adaptive_timeout': True,
+        'sends_callback': True,
+        'content_changes_only': True,
+    },
+    {
+        'queue_name': DOOR43_CATALOG_JOB_HANDLER_QUEUE_NAME,
+        'function_name': 'webhook.job',
+        'stats_name': 'enqueue-catalog-job',
+        'event_types': ['push', 'release', 'delete', 'repository'], # Not fork or pdf_request
+        'push_ref_pattern': r'^refs/heads/{default_branch}$', # The catalog doesn't contain other branches
+        'content_changes_only': True,
+    },
+]
+FANOUT_TABLE_FILEPATH = getenv('FANOUT_TABLE_FILEPATH', '')
+# Either 'rq' (a job on each queue) or 'streams' (one stream entry per event, with a consumer group for each queue)
+QUEUE_BACKEND = getenv('QUEUE_BACKEND', 'rq')
 
 # Get the redis URL from the environment, otherwise use a local test instance
 REDIS_HOSTNAME = getenv('REDIS_HOSTNAME', 'redis')
+# Optionally spread the jobs across several Redis instances, e.g., 'redis1,redis2:6380' (overrides REDIS_HOSTNAME)
+REDIS_HOSTNAMES = get_shard_hostnames(getenv('REDIS_HOSTNAMES', ''), REDIS_HOSTNAME)
 # Use this to detect test mode (coz logs will go into a separate AWS CloudWatch stream)
 DEBUG_MODE_FLAG = getenv('DEBUG_MODE', 'False').lower() not in ('false', '0', 'f', '')
 TEST_STRING = " (TEST)" if DEBUG_MODE_FLAG else ""
+DEBUG_LOG_SAMPLE_RATE = float(getenv('DEBUG_LOG_SAMPLE_RATE', '1')) # e.g., 0.1 to only log one in ten DEBUG records
+# Telemetry calls slower than these (in seconds) count as failures for the circuit breakers
+STATSD_LATENCY_THRESHOLD = float(getenv('STATSD_LATENCY_THRESHOLD', '0.1'))
+CLOUDWATCH_LATENCY_THRESHOLD = float(getenv('CLOUDWATCH_LATENCY_THRESHOLD', '0.5'))
+REDIS_KEY_PREFIX = f'{PREFIX}{LOGGING_NAME}:' # For our own (non-rq) Redis keys that aren't per-environment
+# Profiling of the request handlers (see request_profiler.py) -- a zero sample rate disables it
+PROFILE_SAMPLE_RATE = float(getenv('PROFILE_SAMPLE_RATE', '0')) # e.g., 0.01 to profile one in a hundred requests
+PROFILE_SLOW_SECONDS = float(getenv('PROFILE_SLOW_SECONDS', '0')) # e.g., 2 to only keep the profiles of slow requests
+PROFILE_DIRPATH = getenv('PROFILE_DIRPATH', f'/tmp/{PREFIX}{LOGGING_NAME}_profiles/')
+ADMIN_TOKEN = getenv('ADMIN_TOKEN', '') # The admin endpoints are disabled if this isn't set
 
 # global variables
 echo_prodn_to_dev_flag = False
@@ -66,6 +125,12 @@ logger = logging.getLogger(PREFIXED_LOGGING_NAME)
 sh = logging.StreamHandler(sys.stdout)
 sh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s: %(message)s'))
 logger.addHandler(sh)
+# The circuit breakers log their state changes locally only (not via the backends that they guard)
+breaker_logger = logging.getLogger(f'{PREFIXED_LOGGING_NAME}.breakers')
+breaker_logger.propagate = False
+breaker_logger.addHandler(sh)
+cloudwatch_breaker = CircuitBreaker('cloudwatch', CLOUDWATCH_LATENCY_THRESHOLD, breaker_logger)
+statsd_breaker = CircuitBreaker('statsd', STATSD_LATENCY_THRESHOLD, breaker_logger)
 aws_access_key_id = environ['AWS_ACCESS_KEY_ID']
 aws_secret_access_key = environ['AWS_SECRET_ACCESS_KEY']
 boto3_client = boto3.client("logs", aws_access_key_id=aws_access_key_id,
@@ -77,63 +142,144 @@ log_group_name = f"{'' if test_mode_flag or travis_flag else PREFIX}tX" \
                  f"{'_DEBUG' if DEBUG_MODE_FLAG else ''}" \
                  f"{'_TEST' if test_mode_flag else ''}" \
                  f"{'_TravisCI' if travis_flag else ''}"
-watchtower_log_handler = watchtower.CloudWatchLogHandler(boto3_client=boto3_client,
+watchtower_log_handler = GuardedCloudWatchLogHandler(cloudwatch_breaker,
+                                                boto3_client=boto3_client,
                                                 log_group_name=log_group_name,
                                                 stream_name=PREFIXED_LOGGING_NAME)
 logger.addHandler(watchtower_log_handler)
 logger.debug(f"Logging to AWS CloudWatch group '{log_group_name}' using key '…{aws_access_key_id[-2:]}'.")
 # Enable DEBUG logging for dev- instances (but less logging for production)
 logger.setLevel(logging.DEBUG if PREFIX else logging.INFO)
+if DEBUG_LOG_SAMPLE_RATE < 1:
+    logger.addFilter(DebugSamplingFilter(DEBUG_LOG_SAMPLE_RATE))
 
 
 # Setup queue variables
 QUEUE_NAME_SUFFIX = '' # Used to switch to a different queue, e.g., '_1'
 if PREFIX not in ('', DEV_PREFIX):
     logger.critical(f"Unexpected prefix: '{PREFIX}' — expected '' or '{DEV_PREFIX}'")
-if PREFIX: # don't use production queue
-    djh_adjusted_webhook_queue_name = PREFIXED_DOOR43_JOB_HANDLER_QUEUE_NAME + QUEUE_NAME_SUFFIX # Will become our main queue name
-    djh_adjusted_callback_queue_name = PREFIXED_DOOR43_JOB_HANDLER_CALLBACK_QUEUE_NAME + QUEUE_NAME_SUFFIX
-    dcjh_adjusted_queue_name = PREFIXED_DOOR43_CATALOG_JOB_HANDLER_QUEUE_NAME + QUEUE_NAME_SUFFIX # Will become the catalog handler queue name
-else: # production code
-    djh_adjusted_webhook_queue_name = DOOR43_JOB_HANDLER_QUEUE_NAME + QUEUE_NAME_SUFFIX # Will become our main queue name
-    djh_adjusted_callback_queue_name = DOOR43_JOB_HANDLER_CALLBACK_QUEUE_NAME + QUEUE_NAME_SUFFIX
-    dcjh_adjusted_queue_name = DOOR43_CATALOG_JOB_HANDLER_QUEUE_NAME + QUEUE_NAME_SUFFIX # Will become the catalog handler queue name
-# NOTE: The prefixed version must also listen at a different port (specified in gunicorn run command)
-
-
-prefix_string = f" ({PREFIX})" if PREFIX else ""
+# NOTE: Unless MULTIPLEXED_MODE is set, the prefixed version must also listen at a different port (specified in gunicorn run command)
+
+
+prefix_string = f" ({', '.join(repr(queue_prefix) for queue_prefix in SERVED_PREFIXES)})" if MULTIPLEXED_MODE \
+                    else f" ({PREFIX})" if PREFIX else ""
 logger.info(f"enqueueMain.py{prefix_string}{TEST_STRING} running on Python v{sys.version}")
 
 
 # Connect to Redis now so it fails at import time if no Redis instance available
-logger.info(f"redis_hostname is '{REDIS_HOSTNAME}'")
+logger.info(f"redis_hostname(s) is {REDIS_HOSTNAMES}")
 logger.debug(f"{PREFIXED_LOGGING_NAME} connecting to Redis…")
-redis_connection = StrictRedis(host=REDIS_HOSTNAME)
-logger.debug("Getting total worker count in order to verify working Redis connection…")
-total_rq_worker_count = Worker.count(connection=redis_connection)
+redis_shard_ring = RedisShardRing(REDIS_HOSTNAMES)
+logger.debug("Getting total worker count in order to verify working Redis connection(s)…")
+total_rq_worker_count = 0
+redis_startup_errors = []
+for redis_shard in redis_shard_ring.shards:
+    try:
+        total_rq_worker_count += Worker.count(connection=redis_shard.connection)
+    except REDIS_CONNECTION_ERRORS as e:
+        logger.critical(f"Unable to connect to Redis shard '{redis_shard.name}': {e!r}")
+        redis_shard.mark_down()
+        redis_startup_errors.append(e)
+if len(redis_startup_errors) == len(redis_shard_ring.shards): # None of them are working
+    raise redis_startup_errors[0]
 logger.debug(f"Total rq workers = {total_rq_worker_count}")
 
 
 # Get the Graphite URL from the environment, otherwise use a local test instance
 graphite_url = getenv('GRAPHITE_HOSTNAME', 'localhost')
 logger.info(f"graphite_url is '{graphite_url}'")
-stats_prefix = f"door43.{'dev' if PREFIX else 'prod'}"
-enqueue_job_stats_prefix = f"{stats_prefix}.enqueue-job"
-enqueue_callback_job_stats_prefix = f"{stats_prefix}.enqueue-callback-job"
-enqueue_catalog_job_stats_prefix = f"{stats_prefix}.enqueue-catalog-job"
-stats_client = StatsClient(host=graphite_url, port=8125)
+stats_client = GuardedStatsClient(host=graphite_url, port=8125, breaker=statsd_breaker)
+
+
+# Load our downstream queues -- this fails at import time if the table is invalid
+if FANOUT_TABLE_FILEPATH:
+    logger.info(f"Loading webhook fan-out table from '{FANOUT_TABLE_FILEPATH}'")
+    with open(FANOUT_TABLE_FILEPATH, 'rt') as fanout_table_file:
+        webhook_fanout_config = load_fanout_table(fanout_table_file.read())
+else:
+    webhook_fanout_config = DEFAULT_WEBHOOK_FANOUT_TABLE
+
+
+def get_environment(queue_prefix:str) -> Dict[str,Any]:
+    """
+    Returns a dict of the queue names, timeouts, DCS URL, stats prefixes, etc.
+        for the production ('') or dev- queue chain.
+
+    NOTE: DCS_URL (if set) only applies to the QUEUE_PREFIX environment.
+    """
+    stats_prefix = f"door43.{'dev' if queue_prefix else 'prod'}"
+    webhook_timeout = DEV_WEBHOOK_TIMEOUT if queue_prefix else PROD_WEBHOOK_TIMEOUT
+    webhook_fanout_table = [{**fanout_entry,
+                                'adjusted_queue_name': queue_prefix + fanout_entry['queue_name'] + QUEUE_NAME_SUFFIX,
+                                'stats_prefix': f"{stats_prefix}.{fanout_entry['stats_name']}",
+                                'job_timeout': fanout_entry.get('timeout') or webhook_timeout,
+                            } for fanout_entry in webhook_fanout_config]
+    return {'prefix': queue_prefix,
+            'logging_name': queue_prefix + LOGGING_NAME,
+            'job_handler_name': queue_prefix + DOOR43_JOB_HANDLER_QUEUE_NAME,
+            'dcs_url': DCS_URL if queue_prefix == PREFIX else get_default_dcs_url(queue_prefix),
+            'webhook_fanout_table': webhook_fanout_table,
+            'fanout_stats_prefixes': {fanout_entry['adjusted_queue_name']:fanout_entry['stats_prefix']
+                                        for fanout_entry in webhook_fanout_table},
+            'callback_sending_queue_names': [fanout_entry['adjusted_queue_name'] for fanout_entry in webhook_fanout_table
+                                                if fanout_entry.get('sends_callback')],
+            'callback_queue_name': queue_prefix + DOOR43_JOB_HANDLER_CALLBACK_QUEUE_NAME + QUEUE_NAME_SUFFIX,
+            'callback_timeout': DEV_CALLBACK_TIMEOUT if queue_prefix else PROD_CALLBACK_TIMEOUT,
+            'enqueue_job_stats_prefix': f"{stats_prefix}.enqueue-job",
+            'enqueue_callback_job_stats_prefix': f"{stats_prefix}.enqueue-callback-job",
+            'redis_key_prefix': f'{queue_prefix}{LOGGING_NAME}:', # For our own (non-rq) Redis keys
+            'queue_backend': get_queue_backend(QUEUE_BACKEND, f'{queue_prefix}door43_'),
+            }
+# end of get_environment function
+
+environments = {queue_prefix:get_environment(queue_prefix) for queue_prefix in SERVED_PREFIXES}
+logger.info(f"Using '{QUEUE_BACKEND}' queue backend")
+for served_environment in environments.values():
+    for redis_shard in redis_shard_ring.get_available_shards():
+        try:
+            served_environment['queue_backend'].prepare(redis_shard.connection, 'webhook', served_environment['fanout_stats_prefixes'].keys())
+            served_environment['queue_backend'].prepare(redis_shard.connection, 'callback', [served_environment['callback_queue_name']])
+        except REDIS_CONNECTION_ERRORS as e:
+            logger.critical(f"Unable to prepare queues on Redis shard '{redis_shard.name}': {e!r}")
+            redis_shard.mark_down()
+
+
+# NOTE: The profiler settings can be changed by an admin request to any gunicorn worker,
+#           so they're shared via Redis (but only checked every so often)
+request_profiler = RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_SLOW_SECONDS, PROFILE_DIRPATH)
+PROFILER_SETTINGS_KEY = f'{REDIS_KEY_PREFIX}profiler_settings'
+PROFILER_SETTING_NAMES = ('sample_rate', 'slow_seconds')
+def get_shared_profiler_settings() -> Dict[str,float]:
+    setting_values = redis_shard_ring.get_shard(None).connection.hmget(PROFILER_SETTINGS_KEY, PROFILER_SETTING_NAMES)
+    return {setting_name:float(setting_value) for setting_name, setting_value
+            in zip(PROFILER_SETTING_NAMES, setting_values) if setting_value is not None}
+if ADMIN_TOKEN: # Otherwise they can't be changed
+    request_profiler.get_shared_settings = get_shared_profiler_settings
+if PROFILE_SAMPLE_RATE:
+    logger.info(f"Profiling {PROFILE_SAMPLE_RATE:.1%} of requests (slower than {PROFILE_SLOW_SECONDS}s) into '{PROFILE_DIRPATH}'")
 
 
 app = Flask(__name__)
-if PREFIX:
-    CORS(app, resources={r"/*": {"origins": "*", "allow_headers": "*", "expose_headers": "*"}})
+# Cross-origin requests are only allowed for the dev- environment
+#   (decided for each request because in MULTIPLEXED_MODE the environment can come from the path or the hostname)
+DEV_CORS_OPTIONS = get_cors_options(app, {"origins": "*", "allow_headers": "*", "expose_headers": "*"})
+@app.after_request
+def add_cors_headers(response):
+    """
+    Adds the CORS headers to responses for the dev- environment.
+    """
+    if get_request_environment()['prefix']:
+        set_cors_headers(response, DEV_CORS_OPTIONS)
+    return response
+# end of add_cors_headers()
 # Not sure that we need this Flask logging
 # app.logger.addHandler(watchtower_log_handler)
 # logging.getLogger('werkzeug').addHandler(watchtower_log_handler)
-logger.info(f"{djh_adjusted_webhook_queue_name}, {djh_adjusted_callback_queue_name} and {dcjh_adjusted_queue_name} are up and ready to go")
+for served_environment in environments.values():
+    logger.info(f"{', '.join(fanout_entry['adjusted_queue_name'] for fanout_entry in served_environment['webhook_fanout_table'])} and {served_environment['callback_queue_name']} are up and ready to go")
 
 
-def handle_failed_queue(queue_name:str) -> int:
+def handle_failed_queue(queue_name:str, redis_connection:StrictRedis) -> int:
     """
     Go through the failed queue, and see how many entries originated from our queue.
 
@@ -160,63 +306,207 @@ def handle_failed_queue(queue_name:str) -> int:
 # end of handle_failed_queue function
 
 
+def gauge_queue_stats(environment:Dict[str,Any], queue_name:str, queue_stats_prefix:str) -> Tuple[int,int,int]:
+    """
+    Gauges the queue length, failed job count, and worker count
+        for the queue (of the environment) on each available Redis shard.
+
+    Returns a 3-tuple of the totals across all the shards.
+    """
+    queue_backend = environment['queue_backend']
+    total_queue_length = total_failed_count = total_worker_count = 0
+    for redis_shard in redis_shard_ring.get_available_shards():
+        try:
+            queue_length = queue_backend.get_queue_length(redis_shard.connection, queue_name) # Should normally sit at zero here
+            failed_count = handle_failed_queue(queue_name, redis_shard.connection) \
+                            if queue_backend.name == 'rq' else 0 # Stream entries stay pending until acknowledged
+            worker_count = queue_backend.get_worker_count(redis_shard.connection, queue_name)
+        except REDIS_CONNECTION_ERRORS as e:
+            logger.critical(f"Redis shard '{redis_shard.name}' failed with {e!r} -- marking it as down")
+            redis_shard.mark_down()
+            continue
+        if len(redis_shard_ring.shards) > 1: # Also show the per-shard figures
+            shard_stats_prefix = f'{queue_stats_prefix}.shards.{redis_shard.stats_name}'
+            stats_client.gauge(f'{shard_stats_prefix}.queue.length.current', queue_length)
+            stats_client.gauge(f'{shard_stats_prefix}.queue.length.failed', failed_count)
+            stats_client.gauge(f'{shard_stats_prefix}.workers.available', worker_count)
+        total_queue_length += queue_length
+        total_failed_count += failed_count
+        total_worker_count += worker_count
+    stats_client.gauge(f'{queue_stats_prefix}.queue.length.current', total_queue_length)
+    stats_client.gauge(f'{queue_stats_prefix}.queue.length.failed', total_failed_count)
+    stats_client.gauge(f'{queue_stats_prefix}.workers.available', total_worker_count)
+    return total_queue_length, total_failed_count, total_worker_count
+# end of gauge_queue_stats function
+
+
+def get_queue_counts(environment:Dict[str,Any], queue_name:str) -> Tuple[int,int]:
+    """
+    Returns the queue length and worker count for the queue (of the environment)
+        totalled across the available Redis shards.
+
+    Unlike gauge_queue_stats(), this doesn't look at (or clean up) the failed jobs, or send any gauges.
+    """
+    total_queue_length = total_worker_count = 0
+    for redis_shard in redis_shard_ring.get_available_shards():
+        try:
+            total_queue_length += environment['queue_backend'].get_queue_length(redis_shard.connection, queue_name)
+            total_worker_count += environment['queue_backend'].get_worker_count(redis_shard.connection, queue_name)
+        except REDIS_CONNECTION_ERRORS as e:
+            logger.critical(f"Redis shard '{redis_shard.name}' failed with {e!r} -- marking it as down")
+            redis_shard.mark_down()
+    return total_queue_length, total_worker_count
+# end of get_queue_counts function
+
+
+def gauge_queue_capacity(environment:Dict[str,Any], queue_name:str, queue_stats_prefix:str,
+                            queue_length:int, worker_count:int) -> Dict[str,Any]:
+    """
+    Gauges the recommended worker count and predicted drain time for the queue
+        (from the arrival rate and service time kept in the first available Redis shard).
+
+    NOTE: These gauges are only sent when jobs are queued (so they keep their last value when idle)
+            -- autoscalers should poll the capacity/ URL instead.
+
+    Returns the capacity estimate dict (or an empty dict if Redis failed).
+    """
+    try:
+        capacity_dict = get_queue_capacity(redis_shard_ring.get_shard(None).connection, environment['redis_key_prefix'],
+                                            queue_name, queue_length, worker_count)
+    except REDIS_CONNECTION_ERRORS as e:
+        logger.error(f"Unable to estimate capacity for {queue_name}: {e!r}")
+        return {}
+    stats_client.gauge(f'{queue_stats_prefix}.capacity.arrivals.per_minute', capacity_dict['arrivals_per_minute'])
+    stats_client.gauge(f'{queue_stats_prefix}.capacity.workers.recommended', capacity_dict['recommended_worker_count'])
+    if capacity_dict['drain_seconds'] is not None:
+        stats_client.gauge(f'{queue_stats_prefix}.capacity.drain.seconds', capacity_dict['drain_seconds'])
+    return capacity_dict
+# end of gauge_queue_capacity function
+
+
+def record_queue_arrival(environment:Dict[str,Any], queue_name:str) -> None:
+    """
+    Count a job that we've queued (for the capacity estimates).
+    """
+    try:
+        record_arrival(redis_shard_ring.get_shard(None).connection, environment['redis_key_prefix'], queue_name)
+    except REDIS_CONNECTION_ERRORS as e:
+        logger.error(f"Unable to record arrival for {queue_name}: {e!r}")
+# end of record_queue_arrival function
+
+
+def parse_job_identifier(identifier:Optional[str]) -> Tuple[Optional[str],Optional[str]]:
+    """
+    Extracts the 'owner/repo' name and the (shortened) commit id
+        from a tX job identifier like 'owner--repo--93829a566c'
+        (which may use either '/' or '--' as the separator).
+
+    Returns None for anything that's missing or unexpected.
+    """
+    if not identifier or not isinstance(identifier, str):
+        return None, None
+    identifier_parts = identifier.split('/') if '/' in identifier else identifier.split('--')
+    if len(identifier_parts) < 2:
+        return None, None
+    return f'{identifier_parts[0]}/{identifier_parts[1]}', \
+            identifier_parts[2] if len(identifier_parts) > 2 and identifier_parts[2] else None
+# end of parse_job_identifier function
+
+
+def get_request_environment() -> Dict[str,Any]:
+    """
+    Returns the environment (production or dev-) dict for the current request.
+    """
+    return environments[select_environment_prefix(request.path, request.host, SERVED_PREFIXES,
+                                                    ENVIRONMENT_HOSTNAMES, PREFIX)]
+# end of get_request_environment function
+
+
+def get_event_type() -> str:
+    """
+    Returns the X-Gitea-Event header of the current request (used to group the profiles).
+
+    Anything that's not a valid event is grouped as 'other'
+        (so that clients can't create any number of profile groups and files).
+    """
+    event_type = request.headers.get('X-Gitea-Event')
+    return event_type if event_type in VALID_EVENTS else 'other'
+# end of get_event_type function
+
+
+def is_admin_request() -> bool:
+    """
+    Returns True if the current request has the ADMIN_TOKEN
+        (as an 'Authorization: Bearer …' header).
+    """
+    if not ADMIN_TOKEN:
+        return False
+    authorization = request.headers.get('Authorization', '')
+    return authorization.startswith('Bearer ') \
+        and hmac.compare_digest(authorization[len('Bearer '):].encode(), ADMIN_TOKEN.encode())
+# end of is_admin_request function
+
+
 # This is the main workhorse part of this code
 #   rq automatically returns a "Method Not Allowed" error for a GET, etc.
 @app.route('/'+WEBHOOK_URL_SEGMENT, methods=['POST'])
+@request_profiler.profiled('webhook', get_event_type)
 def job_receiver():
     """
     Accepts POST requests and checks the (json) payload
 
-    Queues the approved jobs at redis instance at global redis_hostname:6379.
-    Queue name is djh_adjusted_webhook_queue_name and dcjh_adjusted_queue_name(may have been prefixed).
+    Queues the approved jobs at the redis shard (instance) chosen for the repo.
+    The queues are chosen from the webhook_fanout_table of the environment (production or dev-) for the request.
     """
     #assert request.method == 'POST'
+    environment = get_request_environment()
+    enqueue_job_stats_prefix = environment['enqueue_job_stats_prefix']
     stats_client.incr(f'{enqueue_job_stats_prefix}.posts.attempted')
-    logger.info(f"WEBHOOK received by {PREFIXED_LOGGING_NAME}: {request}")
+    delivery = DeliveryRecord('webhook', request.headers)
+
+    # Quickly reject pings and junk using only the headers (before any Redis work or json parsing)
+    #   so these aren't saved as deliveries either (only counted)
+    precheck_error_dict = check_posted_headers(request)
+    delivery.end_stage('precheck')
+    if precheck_error_dict:
+        stats_client.incr(f'{enqueue_job_stats_prefix}.posts.rejected')
+        precheck_error_dict['status'] = 'invalid'
+        logger.debug(f"{environment['logging_name']} rejected {request} from headers; responding with {precheck_error_dict}")
+        return jsonify(precheck_error_dict), 400
+    g.delivery = delivery # Saved by record_delivery()
+
+    logger.info(f"WEBHOOK received by {environment['logging_name']}: {request}")
     # NOTE: 'request' above typically displays something like "<Request 'http://git.door43.org/' [POST]>"
 
-    djh_queue = Queue(djh_adjusted_webhook_queue_name, connection=redis_connection)
-    dcjh_queue = Queue(dcjh_adjusted_queue_name, connection=redis_connection)
-
-    # Collect and log some helpful information
-    len_djh_queue = len(djh_queue) # Should normally sit at zero here
-    stats_client.gauge(f'{enqueue_job_stats_prefix}.queue.length.current', len_djh_queue)
-    len_djh_failed_queue = handle_failed_queue(djh_adjusted_webhook_queue_name)
-    stats_client.gauge(f'{enqueue_job_stats_prefix}.queue.length.failed', len_djh_failed_queue)
-    len_dcjh_queue = len(dcjh_queue) # Should normally sit at zero here
-    stats_client.gauge(f'{enqueue_catalog_job_stats_prefix}.queue.length.current', len_dcjh_queue)
-    len_dcjh_failed_queue = handle_failed_queue(dcjh_adjusted_queue_name)
-    stats_client.gauge(f'{enqueue_catalog_job_stats_prefix}.queue.length.failed', len_dcjh_failed_queue)
-
-    # Find out how many workers we have
-    total_worker_count = Worker.count(connection=redis_connection)
-    logger.debug(f"Total rq workers = {total_worker_count}")
-    djh_queue_worker_count = Worker.count(queue=djh_queue)
-    logger.debug(f"Our {djh_adjusted_webhook_queue_name} queue workers = {djh_queue_worker_count}")
-    stats_client.gauge(f'{enqueue_job_stats_prefix}.workers.available', djh_queue_worker_count)
-    if djh_queue_worker_count < 1:
-        logger.critical(f"{PREFIXED_DOOR43_JOB_HANDLER_QUEUE_NAME} has no job handler workers running!")
-        # Go ahead and queue the job anyway for when a worker is restarted
-
-    dcjh_queue_worker_count = Worker.count(queue=dcjh_queue)
-    logger.debug(f"Our {dcjh_adjusted_queue_name} queue workers = {dcjh_queue_worker_count}")
-    stats_client.gauge(f'{enqueue_catalog_job_stats_prefix}.workers.available', dcjh_queue_worker_count)
-    if dcjh_queue_worker_count < 1:
-        logger.critical(f"{PREFIXED_DOOR43_CATALOG_JOB_HANDLER_QUEUE_NAME} has no job handler workers running!")
-        # Go ahead and queue the job anyway for when a worker is restarted
-
-    response_ok_flag, response_dict = check_posted_payload(request, logger)
+    # Collect and log some helpful information (totalled across all of the Redis shards)
+    queue_lengths, failed_counts, worker_counts = {}, {}, {}
+    for fanout_entry in environment['webhook_fanout_table']:
+        queue_lengths[fanout_entry['adjusted_queue_name']], failed_counts[fanout_entry['adjusted_queue_name']], \
+            worker_counts[fanout_entry['adjusted_queue_name']] = \
+                gauge_queue_stats(environment, fanout_entry['adjusted_queue_name'], fanout_entry['stats_prefix'])
+        worker_count = worker_counts[fanout_entry['adjusted_queue_name']]
+        logger.debug(f"Our {fanout_entry['adjusted_queue_name']} queue workers = {worker_count}")
+        if worker_count < 1:
+            logger.critical(f"{fanout_entry['adjusted_queue_name']} has no job handler workers running!")
+            # Go ahead and queue the job anyway for when a worker is restarted
+    delivery.end_stage('queue_stats')
+
+    response_ok_flag, response_dict = check_posted_payload(request, logger, environment['dcs_url'])
+    delivery.end_stage('payload_check')
+    delivery.payload_digest = get_payload_digest(request.get_data())
     # response_dict is json payload if successful, else error info
     if response_ok_flag:
-        logger.debug(f"{PREFIXED_LOGGING_NAME} queuing good payload…")
+        logger.debug(f"{environment['logging_name']} queuing good payload…")
+
+        try:
+            repo_name = response_dict['repository']['full_name']
+        except (KeyError, AttributeError, TypeError):
+            repo_name = None
+        delivery.repo_name = repo_name
 
         # Check for special switch to echo production requests to dev- chain
         global echo_prodn_to_dev_flag
-        if not PREFIX: # Only apply to production chain
-            try:
-                repo_name = response_dict['repository']['full_name']
-            except (KeyError, AttributeError):
-                repo_name = None
+        if not environment['prefix']: # Only apply to production chain
             if repo_name == 'tx-manager-test-data/echo_prodn_to_dev_on':
                 echo_prodn_to_dev_flag = True
                 logger.info("TURNED ON 'echo_prodn_to_dev_flag'!\n")
@@ -228,6 +518,20 @@ def job_receiver():
                 stats_client.incr(f'{enqueue_job_stats_prefix}.posts.succeeded')
                 return jsonify({'success': True, 'status': 'echo off'})
 
+        # Decide (once) which downstream queues want this event
+        fanout_targets = get_fanout_targets(environment['webhook_fanout_table'], response_dict['DCS_event'], response_dict)
+        if response_dict.get('door43_content_changed') is False:
+            stats_client.incr(f'{enqueue_job_stats_prefix}.posts.non_content')
+            # Only count the queues that would otherwise have wanted the push
+            for fanout_entry in get_fanout_targets(environment['webhook_fanout_table'], response_dict['DCS_event'], response_dict,
+                                                    ignore_content_changes=True):
+                if fanout_entry not in fanout_targets:
+                    stats_client.incr(f"{fanout_entry['stats_prefix']}.builds.skipped")
+        if not fanout_targets:
+            logger.info(f"No downstream queues want this '{response_dict['DCS_event']}' event for '{repo_name}'\n")
+            stats_client.incr(f'{enqueue_job_stats_prefix}.posts.unwanted')
+            return jsonify({'success': True, 'status': 'not queued'})
+
         # Add our fields
         response_dict['door43_webhook_retry_count'] = 0 # In case we want to retry failed jobs
         response_dict['door43_webhook_received_at'] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ') # Used to calculate total elapsed time
@@ -235,25 +539,51 @@ def job_receiver():
         # NOTE: No ttl specified on the next line -- this seems to cause unrun jobs to be just silently dropped
         #           (For now at least, we prefer them to just stay in the queue if they're not getting processed.)
         #       The timeout value determines the max run time of the worker once the job is accessed
-        djh_queue.enqueue('webhook.job', response_dict, job_timeout=WEBHOOK_TIMEOUT) # A function named webhook.job will be called by the worker
-        dcjh_queue.enqueue('webhook.job', response_dict, job_timeout=WEBHOOK_TIMEOUT) # A function named webhook.job will be called by the worker
-        # NOTE: The above line can return a result from the webhook.job function. (By default, the result remains available for 500s.)
-
-        len_djh_queue = len(djh_queue) # Update
-        len_dcjh_queue = len(dcjh_queue) # Update
-        logger.info(f"{PREFIXED_DOOR43_JOB_HANDLER_QUEUE_NAME} queued valid job to {djh_adjusted_webhook_queue_name} queue " \
-                    f"({len_djh_queue} jobs now " \
-                        f"for {Worker.count(queue=djh_queue)} workers, " \
-                    f"({len_dcjh_queue} jobs now " \
-                        f"for {Worker.count(queue=dcjh_queue)} workers, " \
-                    f"{len_djh_failed_queue} failed jobs) at {datetime.utcnow()}, " \
-                    f"{len_dcjh_failed_queue} failed jobs) at {datetime.utcnow()}\n")
+        #       The repo name decides which Redis shard gets the jobs (so jobs for a repo stay in order)
+        def enqueue_webhook_jobs(redis_connection:StrictRedis) -> Dict[str,str]:
+            queue_jobs = []
+            for fanout_entry in fanout_targets:
+                job_timeout = fanout_entry['job_timeout']
+                if fanout_entry.get('adaptive_timeout') and repo_name:
+                    job_timeout = get_job_timeout(redis_connection, environment['redis_key_prefix'], repo_name, job_timeout)
+                    logger.debug(f"Using job_timeout={job_timeout} for '{repo_name}' on {fanout_entry['adjusted_queue_name']}")
+                queue_jobs.append({'queue_name': fanout_entry['adjusted_queue_name'],
+                                   'function_name': fanout_entry['function_name'],
+                                   'job_timeout': job_timeout})
+            return environment['queue_backend'].enqueue(redis_connection, 'webhook', queue_jobs, response_dict)
+        redis_shard, queued_job_ids = redis_shard_ring.run_on_shard(repo_name, enqueue_webhook_jobs, logger)
+        delivery.end_stage('enqueue')
+        delivery.job_ids = queued_job_ids
+
+        # Remember the jobs so that the callback for them can tell us their runtime, queue wait, and turnaround times
+        if repo_name:
+            try:
+                record_jobs_enqueued(redis_shard.connection, environment['redis_key_prefix'], repo_name, get_job_ref(response_dict),
+                                        response_dict['DCS_event'], queued_job_ids)
+            except REDIS_CONNECTION_ERRORS as e:
+                logger.error(f"Unable to record queued jobs for '{repo_name}': {e!r}")
+
+        for fanout_entry in fanout_targets:
+            len_target_queue = environment['queue_backend'].get_queue_length(redis_shard.connection, fanout_entry['adjusted_queue_name']) # Update
+            target_worker_count = environment['queue_backend'].get_worker_count(redis_shard.connection, fanout_entry['adjusted_queue_name'])
+            logger.info(f"{environment['logging_name']} queued valid job to {fanout_entry['adjusted_queue_name']} queue on '{redis_shard.name}' " \
+                        f"({len_target_queue} jobs now " \
+                            f"for {target_worker_count} workers, " \
+                        f"{failed_counts[fanout_entry['adjusted_queue_name']]} failed jobs) at {datetime.utcnow()}\n")
+            stats_client.incr(f"{fanout_entry['stats_prefix']}.jobs.queued")
+            record_queue_arrival(environment, fanout_entry['adjusted_queue_name'])
+            # The capacity is estimated from the totals across all the shards (like the capacity/ URL)
+            #   i.e., the totals from before we queued, plus this job
+            gauge_queue_capacity(environment, fanout_entry['adjusted_queue_name'], fanout_entry['stats_prefix'],
+                                    queue_lengths[fanout_entry['adjusted_queue_name']] + 1, worker_counts[fanout_entry['adjusted_queue_name']])
 
         webhook_return_dict = {'success': True,
                                'status': 'queued',
-                               'queue_name': djh_adjusted_webhook_queue_name,
+                               'queue_name': fanout_targets[0]['adjusted_queue_name'],
+                               'queue_names': [fanout_entry['adjusted_queue_name'] for fanout_entry in fanout_targets],
                                'door43_job_queued_at': datetime.utcnow()}
         stats_client.incr(f'{enqueue_job_stats_prefix}.posts.succeeded')
+        delivery.end_stage('bookkeeping')
         return jsonify(webhook_return_dict)
     #else:
     stats_client.incr(f'{enqueue_job_stats_prefix}.posts.invalid')
@@ -262,37 +592,40 @@ def job_receiver():
         detail = request.headers['X-Gitea-Event']
     except KeyError:
         detail = "No X-Gitea-Event"
-    logger.error(f"{PREFIXED_LOGGING_NAME} ignored invalid '{detail}' payload; responding with {response_dict}\n")
+    logger.error(f"{environment['logging_name']} ignored invalid '{detail}' payload; responding with {response_dict}\n")
     return jsonify(response_dict), 400
 # end of job_receiver()
 
 
 @app.route('/'+CALLBACK_URL_SEGMENT, methods=['POST'])
+@request_profiler.profiled('callback', lambda: 'callback')
 def callback_receiver():
     """
     Accepts POST requests and checks the (json) payload
 
-    Queues the approved jobs at redis instance at global redis_hostname:6379.
-    Queue name is djh_adjusted_callback_queue_name (may have been prefixed).
+    Queues the approved jobs at the redis shard (instance) chosen for the repo.
+    Queue name is the callback_queue_name of the environment (production or dev-) for the request.
     """
     #assert request.method == 'POST'
+    environment = get_request_environment()
+    enqueue_callback_job_stats_prefix = environment['enqueue_callback_job_stats_prefix']
+    djh_adjusted_callback_queue_name = environment['callback_queue_name']
     stats_client.incr(f'{enqueue_callback_job_stats_prefix}.posts.attempted')
-    logger.info(f"CALLBACK received by {PREFIXED_DOOR43_JOB_HANDLER_QUEUE_NAME}: {request}")
-
-    # Collect (and log) some helpful information
-    djh_queue = Queue(djh_adjusted_callback_queue_name, connection=redis_connection)
-    len_djh_queue = len(djh_queue) # Should normally sit at zero here
-    stats_client.gauge(f'{enqueue_callback_job_stats_prefix}.queue.length.current', len_djh_queue)
-    len_djh_failed_queue = handle_failed_queue(djh_adjusted_callback_queue_name)
-    stats_client.gauge(f'{enqueue_callback_job_stats_prefix}.queue.length.failed', len_djh_failed_queue)
-    djh_queue_worker_count = Worker.count(queue=djh_queue)
+    g.delivery = delivery = DeliveryRecord('callback', request.headers) # Saved by record_delivery()
+    logger.info(f"CALLBACK received by {environment['job_handler_name']}: {request}")
+
+    # Collect (and log) some helpful information (totalled across all of the Redis shards)
+    _len_djh_queue, len_djh_failed_queue, djh_queue_worker_count = \
+        gauge_queue_stats(environment, djh_adjusted_callback_queue_name, enqueue_callback_job_stats_prefix)
     logger.debug(f"Our {djh_adjusted_callback_queue_name} queue workers = {djh_queue_worker_count}")
-    stats_client.gauge(f'{enqueue_callback_job_stats_prefix}.workers.available', djh_queue_worker_count)
+    delivery.end_stage('queue_stats')
 
     response_ok_flag, response_dict = check_posted_callback_payload(request, logger)
+    delivery.end_stage('payload_check')
+    delivery.payload_digest = get_payload_digest(request.get_data())
     # response_dict is json payload if successful, else error info
     if response_ok_flag:
-        logger.debug(f"{PREFIXED_LOGGING_NAME} queuing good callback…")
+        logger.debug(f"{environment['logging_name']} queuing good callback…")
 
         # Add our fields
         response_dict['door43_callback_retry_count'] = 0
@@ -300,8 +633,47 @@ def callback_receiver():
         # NOTE: No ttl specified on the next line -- this seems to cause unrun jobs to be just silently dropped
         #           (For now at least, we prefer them to just stay in the queue if they're not getting processed.)
         #       The timeout value determines the max run time of the worker once the job is accessed
-        djh_queue.enqueue('callback.job', response_dict, job_timeout=CALLBACK_TIMEOUT) # A function named callback.job will be called by the worker
-        # NOTE: The above line can return a result from the callback.job function. (By default, the result remains available for 500s.)
+        #       The callback goes to the same Redis shard as the webhook job for the repo
+        repo_name, callback_ref = parse_job_identifier(response_dict.get('identifier'))
+        delivery.repo_name = repo_name
+        def enqueue_callback_job(redis_connection:StrictRedis) -> Dict[str,str]:
+            return environment['queue_backend'].enqueue(redis_connection, 'callback',
+                                        [{'queue_name': djh_adjusted_callback_queue_name,
+                                          'function_name': 'callback.job', # A function named callback.job will be called by the worker
+                                          'job_timeout': environment['callback_timeout']}],
+                                        response_dict)
+        redis_shard, queued_job_ids = redis_shard_ring.run_on_shard(repo_name, enqueue_callback_job, logger)
+        delivery.end_stage('enqueue')
+        delivery.job_ids = queued_job_ids
+
+        # Add to the runtime history (used for adaptive timeouts) for the repo
+        #   and publish the latencies of the webhook jobs that this callback is for
+        if repo_name:
+            runtime_seconds, latencies = None, []
+            try:
+                pending_jobs = pop_pending_jobs(redis_shard.connection, environment['redis_key_prefix'], repo_name, callback_ref)
+                if pending_jobs is not None:
+                    if any(fanout_entry.get('adaptive_timeout') and fanout_entry['adjusted_queue_name'] in pending_jobs['job_ids']
+                           for fanout_entry in environment['webhook_fanout_table']):
+                        runtime_seconds = record_job_callback(redis_shard.connection, environment['redis_key_prefix'],
+                                                                repo_name, pending_jobs['enqueued_at'])
+                    latencies = get_callback_latencies(redis_shard.connection, pending_jobs, environment['callback_sending_queue_names'])
+                for latency_dict in latencies: # Used for the capacity estimates
+                    if 'service_seconds' in latency_dict:
+                        record_service_time(redis_shard_ring.get_shard(None).connection, environment['redis_key_prefix'],
+                                            latency_dict['queue_name'], latency_dict['service_seconds'])
+            except REDIS_CONNECTION_ERRORS as e:
+                logger.error(f"Unable to record callback latencies for '{repo_name}': {e!r}")
+            else:
+                if runtime_seconds is not None:
+                    logger.info(f"'{repo_name}' job took {runtime_seconds}s from webhook until callback")
+                for latency_dict in latencies:
+                    latency_stats_prefix = f"{environment['fanout_stats_prefixes'].get(latency_dict['queue_name'], environment['enqueue_job_stats_prefix'])}" \
+                                           f".latency.{latency_dict['event_type']}"
+                    if 'turnaround_seconds' in latency_dict:
+                        stats_client.timing(f'{latency_stats_prefix}.turnaround', round(latency_dict['turnaround_seconds'] * 1000))
+                    if 'queue_wait_seconds' in latency_dict:
+                        stats_client.timing(f'{latency_stats_prefix}.queue_wait', round(latency_dict['queue_wait_seconds'] * 1000))
 
         # Find out who our workers are
         #workers = Worker.all(connection=redis_connection) # Returns the actual worker objects
@@ -315,10 +687,11 @@ def callback_receiver():
         #djh_queue_worker_count = Worker.count(queue=djh_queue)
         #logger.debug(f"Our {djh_adjusted_callback_queue_name} queue workers = {djh_queue_worker_count}")
 
-        len_djh_queue = len(djh_queue) # Update
-        logger.info(f"{PREFIXED_DOOR43_JOB_HANDLER_QUEUE_NAME} queued valid callback job to {djh_adjusted_callback_queue_name} queue " \
+        len_djh_queue = environment['queue_backend'].get_queue_length(redis_shard.connection, djh_adjusted_callback_queue_name) # Update
+        djh_queue_worker_count = environment['queue_backend'].get_worker_count(redis_shard.connection, djh_adjusted_callback_queue_name)
+        logger.info(f"{environment['job_handler_name']} queued valid callback job to {djh_adjusted_callback_queue_name} queue on '{redis_shard.name}' " \
                     f"({len_djh_queue} jobs now " \
-                        f"for {Worker.count(queue=djh_queue)} workers, " \
+                        f"for {djh_queue_worker_count} workers, " \
                     f"{len_djh_failed_queue} failed jobs) at {datetime.utcnow()}\n")
 
         callback_return_dict = {'success': True,
@@ -326,14 +699,165 @@ def callback_receiver():
                                 'queue_name': djh_adjusted_callback_queue_name,
                                 'door43_callback_queued_at': datetime.utcnow()}
         stats_client.incr(f'{enqueue_callback_job_stats_prefix}.posts.succeeded')
+        delivery.end_stage('bookkeeping')
         return jsonify(callback_return_dict)
     #else:
     stats_client.incr(f'{enqueue_callback_job_stats_prefix}.posts.invalid')
     response_dict['status'] = 'invalid'
-    logger.error(f"{PREFIXED_LOGGING_NAME} ignored invalid callback payload; responding with {response_dict}\n")
+    logger.error(f"{environment['logging_name']} ignored invalid callback payload; responding with {response_dict}\n")
     return jsonify(response_dict), 400
 # end of callback_receiver()
 
 
+@app.route('/'+CAPACITY_URL_SEGMENT, methods=['GET'])
+def capacity_receiver():
+    """
+    Accepts GET requests (e.g., from an autoscaler)
+
+    Returns the capacity estimates (including the recommended worker count
+        and predicted drain time) for each of the webhook queues of the environment for the request.
+
+    NOTE: This is polled, so it only reads the cheap counters
+            (the gauges are sent when jobs are queued).
+          The callback queue isn't included because we don't measure its service times.
+    """
+    environment = get_request_environment()
+    capacity_dicts = {}
+    for fanout_entry in environment['webhook_fanout_table']:
+        queue_name = fanout_entry['adjusted_queue_name']
+        queue_length, worker_count = get_queue_counts(environment, queue_name)
+        try:
+            capacity_dicts[queue_name] = get_queue_capacity(redis_shard_ring.get_shard(None).connection, environment['redis_key_prefix'],
+                                                            queue_name, queue_length, worker_count)
+        except REDIS_CONNECTION_ERRORS as e:
+            logger.error(f"Unable to estimate capacity for {queue_name}: {e!r}")
+            capacity_dicts[queue_name] = {}
+    return jsonify({'success': True, 'status': 'ok', 'queues': capacity_dicts})
+# end of capacity_receiver()
+
+
+@app.route('/'+PROFILING_URL_SEGMENT, methods=['GET', 'POST'])
+def profiling_receiver():
+    """
+    Accepts GET and POST requests with the ADMIN_TOKEN
+
+    A POST with json like {"sample_rate": 0.05, "slow_seconds": 1} changes the profiler settings
+        (for all gunicorn workers within PROFILE_SETTINGS_REFRESH_SECONDS).
+    Returns the settings and the top hotspots for each route and event type.
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'status': 'forbidden'}), 403
+    if request.method == 'POST':
+        settings_dict = request.get_json(silent=True)
+        if not isinstance(settings_dict, dict):
+            return jsonify({'success': False, 'status': 'invalid', 'error': "Expected a json object"}), 400
+        try:
+            request_profiler.update_settings(settings_dict.get('sample_rate'), settings_dict.get('slow_seconds'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'status': 'invalid', 'error': str(e)}), 400
+        shared_settings = {'sample_rate': request_profiler.sample_rate, 'slow_seconds': request_profiler.slow_seconds}
+        try:
+            redis_shard_ring.get_shard(None).connection.hset(PROFILER_SETTINGS_KEY, mapping=shared_settings) # type: ignore[arg-type]
+        except REDIS_CONNECTION_ERRORS as e:
+            logger.error(f"Unable to share profiler settings: {e!r}")
+        logger.info(f"Profiler settings changed to {shared_settings}")
+    return jsonify({'success': True, 'status': 'ok',
+                    'sample_rate': request_profiler.sample_rate,
+                    'slow_seconds': request_profiler.slow_seconds,
+                    'profiles': request_profiler.get_summary()})
+# end of profiling_receiver()
+
+
+@app.route('/'+DELIVERIES_URL_SEGMENT, methods=['GET'])
+def deliveries_receiver():
+    """
+    Accepts GET requests with the ADMIN_TOKEN
+
+    Returns the most recent deliveries (newest first) for the webhook and callback routes
+        (or just one route with ?route=webhook) -- use ?count=10 to get fewer
+        (webhook requests rejected from their headers alone aren't recorded)
+        -- of the environment for the request.
+    """
+    if not is_admin_request():
+        return jsonify({'success': False, 'status': 'forbidden'}), 403
+    environment = get_request_environment()
+    route_names = [request.args['route']] if request.args.get('route') else ['webhook', 'callback']
+    count = request.args.get('count', RECENT_DELIVERIES_LENGTH, type=int)
+    try:
+        deliveries_dict = {route_name:get_recent_deliveries(redis_shard_ring.get_shard(None).connection,
+                                                            environment['redis_key_prefix'], route_name, count)
+                            for route_name in route_names}
+    except REDIS_CONNECTION_ERRORS as e:
+        logger.error(f"Unable to get recent deliveries: {e!r}")
+        return jsonify({'success': False, 'status': 'error', 'error': "Redis unavailable"}), 503
+    return jsonify({'success': True, 'status': 'ok', 'deliveries': deliveries_dict})
+# end of deliveries_receiver()
+
+
+@app.after_request
+def record_delivery(response):
+    """
+    Saves the record of any webhook or callback delivery (with its outcome)
+        to the recent deliveries list for its route.
+    """
+    delivery = g.pop('delivery', None)
+    if delivery is not None and RECENT_DELIVERIES_LENGTH > 0:
+        response_json = response.get_json(silent=True)
+        if not isinstance(response_json, dict):
+            response_json = {}
+        try:
+            save_delivery(redis_shard_ring.get_shard(None).connection, get_request_environment()['redis_key_prefix'],
+                            delivery.get_dict(response.status_code, response_json.get('status'), response_json.get('error')))
+        except REDIS_CONNECTION_ERRORS as e:
+            logger.error(f"Unable to save {delivery.route_name} delivery record: {e!r}")
+    return response
+# end of record_delivery()
+
+
+@app.route('/'+HEALTH_URL_SEGMENT, methods=['GET'])
+def health_receiver():
+    """
+    Accepts GET requests from monitors (like Nagios)
+
+    Deliberately does no Redis work so that it's cheap to poll.
+    Also shows the state of the telemetry circuit breakers (for this gunicorn worker).
+    """
+    return jsonify({'success': True, 'status': 'ok', 'prefix': PREFIX, 'served_prefixes': SERVED_PREFIXES,
+                    'circuit_breakers': {breaker.name:breaker.get_state_dict()
+                                            for breaker in (statsd_breaker, cloudwatch_breaker)}})
+# end of health_receiver()
+
+
+class EnvironmentLogFilter(logging.Filter):
+    """
+    Adds the logging name of the environment of the current request (if any) to each log record
+        as environment_name (for the log formats).
+    """
+    def filter(self, record:logging.LogRecord) -> bool:
+        record.environment_name = get_request_environment()['logging_name'] if has_request_context() \
+                                    else PREFIXED_LOGGING_NAME
+        return True
+# end of EnvironmentLogFilter class
+
+
+# In multiplexed mode, each environment can also be chosen by its path, e.g., '/dev/tx-callback/'
+#   NOTE: Both environments share the logger (whose level is set by QUEUE_PREFIX) and its CloudWatch group and stream
+#           so each log record is tagged with the environment of its request
+if MULTIPLEXED_MODE:
+    environment_log_filter = EnvironmentLogFilter()
+    sh.addFilter(environment_log_filter)
+    sh.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s: [%(environment_name)s] %(message)s'))
+    watchtower_log_handler.addFilter(environment_log_filter)
+    watchtower_log_handler.setFormatter(CloudWatchLogFormatter('[%(environment_name)s] %(message)s'))
+    for queue_prefix in SERVED_PREFIXES:
+        environment_path_segment = get_environment_path_segment(queue_prefix)
+        for url_segment, view_function, methods in ((WEBHOOK_URL_SEGMENT, job_receiver, ['POST']),
+                                                    (CALLBACK_URL_SEGMENT, callback_receiver, ['POST']),
+                                                    (CAPACITY_URL_SEGMENT, capacity_receiver, ['GET']),
+                                                    (DELIVERIES_URL_SEGMENT, deliveries_receiver, ['GET'])):
+            app.add_url_rule(f'/{environment_path_segment}{url_segment}', methods=methods, view_func=view_function,
+                                endpoint=f"{view_function.__name__}_{environment_path_segment.rstrip('/')}")
+
+
 if __name__ == '__main__':
     app.run()
@@ -0,0 +1,52 @@
+# Added Oct 2026 so that one process can serve both the production and dev- queue chains
+#   (sharing the Redis connection pools, the statsd client, and the AWS CloudWatch log handler).
+#   Each environment profile is identified by its queue prefix ('' or 'dev-')
+#   and the profile for each request is chosen by its URL path or its hostname.
+
+from typing import Dict, List
+
+
+def get_environment_path_segment(queue_prefix:str) -> str:
+    """
+    Returns the URL path segment (with a trailing slash but not a leading one)
+        that selects the profile, e.g., 'dev/' for 'dev-' and 'prod/' for ''.
+    """
+    return f"{queue_prefix.rstrip('-') or 'prod'}/"
+# end of get_environment_path_segment function
+
+
+def parse_environment_hostnames(hostnames_string:str, queue_prefixes:List[str]) -> Dict[str,str]:
+    """
+    Parses a comma-separated list of hostname=queue_prefix entries,
+        e.g., 'api.door43.org=,dev-api.door43.org=dev-'.
+
+    Returns a dict of (lowercase) hostnames to queue prefixes.
+    Raises ValueError if an entry is malformed or names a profile that we're not serving.
+    """
+    environment_hostnames = {}
+    for hostname_entry in hostnames_string.split(','):
+        if not hostname_entry.strip():
+            continue
+        if '=' not in hostname_entry:
+            raise ValueError(f"Expected hostname=queue_prefix but got '{hostname_entry}'")
+        hostname, queue_prefix = (part.strip() for part in hostname_entry.split('=', 1))
+        if queue_prefix not in queue_prefixes:
+            raise ValueError(f"Hostname '{hostname}' is for unknown queue prefix '{queue_prefix}' -- expected one of {queue_prefixes}")
+        environment_hostnames[hostname.lower()] = queue_prefix
+    return environment_hostnames
+# end of parse_environment_hostnames function
+
+
+def select_environment_prefix(request_path:str, request_host:str, queue_prefixes:List[str],
+                            environment_hostnames:Dict[str,str], default_prefix:str) -> str:
+    """
+    Chooses the profile for a request: first from its path (e.g., '/dev/tx-callback/'),
+        then from its hostname (ignoring any port), else the default.
+
+    Returns the queue prefix of the profile.
+    """
+    for queue_prefix in queue_prefixes:
+        if request_path.startswith(f'/{get_environment_path_segment(queue_prefix)}'):
+            return queue_prefix
+    return environment_hostnames.get(request_host.split(':')[0].lower(), default_prefix)
+# end of select_environment_prefix function
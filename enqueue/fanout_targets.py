@@ -0,0 +1,103 @@
+# Added Oct 2026 so that the downstream queues for accepted webhook events
+#   are described by a table (which can be loaded from a JSON file)
+#   rather than being hard-coded in job_receiver().
+
+import re
+import json
+from typing import Dict, List, Any, Optional
+
+
+# These are the keys that a fan-out table entry may contain
+REQUIRED_FANOUT_KEYS = ('queue_name', 'function_name', 'stats_name')
+OPTIONAL_FANOUT_KEYS = (
+    'timeout', # e.g., '600s' -- None means use the default webhook timeout
+    'adaptive_timeout', # True means learn the timeout for each repo from its previous runtimes
+    'sends_callback', # True means the jobs on this queue lead to a tX callback (so their turnaround can be measured)
+    'event_types', # List of X-Gitea-Event types that this target wants -- None means all
+    'repo_owners', # List of repo owner usernames that this target wants -- None means all
+    'excluded_repo_owners', # List of repo owner usernames that this target doesn't want
+    'push_ref_pattern', # Regex that the ref of a push must match -- {default_branch} is replaced by the repo's default branch
+    'content_changes_only', # True means skip pushes that only changed non-content files (like README.md)
+    )
+
+
+def load_fanout_table(fanout_table_json:str) -> List[Dict[str,Any]]:
+    """
+    Loads and checks a fan-out table from a JSON string (a list of dicts).
+
+    Raises a ValueError if the table is not in the expected format.
+    """
+    fanout_table = json.loads(fanout_table_json)
+    if not isinstance(fanout_table, list):
+        raise ValueError(f"Fan-out table should be a list, not {type(fanout_table)}")
+    for fanout_entry in fanout_table:
+        check_fanout_entry(fanout_entry)
+    return fanout_table
+# end of load_fanout_table function
+
+
+def check_fanout_entry(fanout_entry:Dict[str,Any]) -> None:
+    """
+    Raises a ValueError if the fan-out table entry is not in the expected format.
+    """
+    if not isinstance(fanout_entry, dict):
+        raise ValueError(f"Fan-out table entry should be a dict, not {type(fanout_entry)}")
+    for required_key in REQUIRED_FANOUT_KEYS:
+        if not fanout_entry.get(required_key):
+            raise ValueError(f"Fan-out table entry is missing '{required_key}': {fanout_entry}")
+    for entry_key in fanout_entry:
+        if entry_key not in REQUIRED_FANOUT_KEYS and entry_key not in OPTIONAL_FANOUT_KEYS:
+            raise ValueError(f"Fan-out table entry has unexpected '{entry_key}': {fanout_entry}")
+    if fanout_entry.get('push_ref_pattern'):
+        re.compile(fanout_entry['push_ref_pattern'].replace('{default_branch}', 'master')) # Check that it compiles
+# end of check_fanout_entry function
+
+
+def is_wanted_by_target(fanout_entry:Dict[str,Any], event_type:str, payload_json:Dict[str,Any],
+                        ignore_content_changes:bool=False) -> bool:
+    """
+    Returns True if the (already checked) event passes the filters of the fan-out table entry.
+
+    With ignore_content_changes, the content_changes_only filter is skipped
+        (e.g., to count the builds that it saves).
+    """
+    if fanout_entry.get('event_types') is not None \
+    and event_type not in fanout_entry['event_types']:
+        return False
+
+    try:
+        repo_owner_username:Optional[str] = payload_json['repository']['owner']['username']
+    except (KeyError, AttributeError, TypeError):
+        repo_owner_username = None
+    if fanout_entry.get('repo_owners') is not None \
+    and repo_owner_username not in fanout_entry['repo_owners']:
+        return False
+    if fanout_entry.get('excluded_repo_owners') \
+    and repo_owner_username in fanout_entry['excluded_repo_owners']:
+        return False
+
+    if fanout_entry.get('push_ref_pattern') and event_type == 'push':
+        try:
+            default_branch = payload_json['repository']['default_branch']
+        except (KeyError, AttributeError, TypeError):
+            default_branch = 'master'
+        ref_pattern = fanout_entry['push_ref_pattern'].replace('{default_branch}', re.escape(str(default_branch)))
+        if not re.match(ref_pattern, str(payload_json.get('ref', ''))):
+            return False
+
+    if fanout_entry.get('content_changes_only') and not ignore_content_changes \
+    and payload_json.get('door43_content_changed') is False: # Missing means we couldn't tell
+        return False
+
+    return True
+# end of is_wanted_by_target function
+
+
+def get_fanout_targets(fanout_table:List[Dict[str,Any]], event_type:str, payload_json:Dict[str,Any],
+                        ignore_content_changes:bool=False) -> List[Dict[str,Any]]:
+    """
+    Returns the list of fan-out table entries that want this event.
+    """
+    return [fanout_entry for fanout_entry in fanout_table
+            if is_wanted_by_target(fanout_entry, event_type, payload_json, ignore_content_changes)]
+# end of get_fanout_targets function
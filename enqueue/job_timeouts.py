@@ -0,0 +1,64 @@
+# Added Oct 2026 so that the webhook job timeout for each repo can be learned
+#   from how long previous jobs for that repo took (from webhook until tX callback)
+#   rather than having one fixed timeout that must suit the very largest repos.
+
+import os
+from math import ceil
+from time import time
+from typing import List, Union
+
+# NOTE: We use StrictRedis() because we don't need the backwards compatibility of Redis()
+from redis import StrictRedis
+
+
+RUNTIME_HISTORY_LENGTH = 20 # Number of recent runtimes kept for each repo
+RUNTIME_HISTORY_EXPIRY_SECONDS = 90 * 24 * 60 * 60 # Forget about repos that haven't been built for a while
+RUNTIME_PERCENTILE = 95
+MIN_RUNTIME_HISTORY_COUNT = 3 # Use the default timeout until we've seen at least this many jobs
+TIMEOUT_HEADROOM_FACTOR = float(os.getenv('ADAPTIVE_TIMEOUT_HEADROOM', '1.5'))
+MIN_ADAPTIVE_TIMEOUT_SECONDS = int(os.getenv('MIN_ADAPTIVE_TIMEOUT', '120'))
+MAX_ADAPTIVE_TIMEOUT_SECONDS = int(os.getenv('MAX_ADAPTIVE_TIMEOUT', '1800'))
+
+
+def get_percentile(values:List[float], percentile:float) -> float:
+    """
+    Returns the nearest-rank percentile of the (non-empty) list of values.
+    """
+    sorted_values = sorted(values)
+    rank = ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+# end of get_percentile function
+
+
+def record_job_callback(redis_connection:StrictRedis, key_prefix:str, repo_name:str, enqueued_at:float) -> float:
+    """
+    Add the time since the webhook job was queued (from the pending jobs record
+        that the callback was matched with -- see latency_tracker.py)
+        to the runtime history for this repo.
+
+    Returns the runtime in seconds.
+    """
+    runtime_seconds = round(time() - enqueued_at, 1)
+    history_key = f'{key_prefix}job_runtimes:{repo_name}'
+    pipeline = redis_connection.pipeline()
+    pipeline.lpush(history_key, runtime_seconds)
+    pipeline.ltrim(history_key, 0, RUNTIME_HISTORY_LENGTH - 1)
+    pipeline.expire(history_key, RUNTIME_HISTORY_EXPIRY_SECONDS)
+    pipeline.execute()
+    return runtime_seconds
+# end of record_job_callback function
+
+
+def get_job_timeout(redis_connection:StrictRedis, key_prefix:str, repo_name:str, default_timeout:Union[int,str]) -> Union[int,str]:
+    """
+    Returns a job timeout (in seconds) for this repo from a high percentile
+        of its runtime history (plus some headroom).
+
+    Returns the default timeout if we don't have enough history yet.
+    """
+    runtimes = [float(runtime) for runtime in redis_connection.lrange(f'{key_prefix}job_runtimes:{repo_name}', 0, -1)]
+    if len(runtimes) < MIN_RUNTIME_HISTORY_COUNT:
+        return default_timeout
+    timeout_seconds = ceil(get_percentile(runtimes, RUNTIME_PERCENTILE) * TIMEOUT_HEADROOM_FACTOR)
+    return min(max(timeout_seconds, MIN_ADAPTIVE_TIMEOUT_SECONDS), MAX_ADAPTIVE_TIMEOUT_SECONDS)
+# end of get_job_timeout function
@@ -0,0 +1,144 @@
+# Added Oct 2026 to measure how long webhook jobs wait in the queue
+#   and how long the full webhook-to-callback cycle takes
+#   by correlating the queued jobs for a repo (and commit) with the tX callback for them.
+#   The same record tells job_timeouts.py how long the webhook job took.
+
+import re
+import json
+from time import time
+from datetime import datetime, timezone
+from typing import Dict, List, Collection, Any, Optional
+
+# NOTE: We use StrictRedis() because we don't need the backwards compatibility of Redis()
+from redis import StrictRedis
+from rq.job import Job
+from rq.exceptions import NoSuchJobError
+
+
+PENDING_JOBS_EXPIRY_SECONDS = 2 * 60 * 60 # Forget about jobs that never got a callback
+STREAM_ENTRY_ID_REGEX = re.compile(r'\d+-\d+$') # The job ids from the streams queue backend
+
+
+def get_timestamp(rq_datetime:Optional[datetime]) -> Optional[float]:
+    """
+    Returns the POSIX timestamp for an rq datetime (which are UTC but may be naive).
+    """
+    if rq_datetime is None:
+        return None
+    if rq_datetime.tzinfo is None:
+        rq_datetime = rq_datetime.replace(tzinfo=timezone.utc)
+    return rq_datetime.timestamp()
+# end of get_timestamp function
+
+
+def get_job_ref(payload:Dict[str,Any]) -> Optional[str]:
+    """
+    Returns the commit id of a push (which tX includes, shortened, in the callback identifier).
+
+    Returns None for other events.
+    """
+    commit_id = payload.get('after')
+    return commit_id if commit_id and isinstance(commit_id, str) else None
+# end of get_job_ref function
+
+
+def record_jobs_enqueued(redis_connection:StrictRedis, key_prefix:str, repo_name:str, job_ref:Optional[str],
+                            event_type:str, job_ids:Dict[str,str]) -> None:
+    """
+    Remember when the jobs were queued for this repo (and commit)
+        so that the callback for them can be matched up with them.
+
+    Each repo has a hash with a field for each commit (or event without a commit)
+        -- HSETNX keeps the earliest time if the same commit is delivered again before its callback.
+
+    Parameter job_ids is a dict of queue names to job ids.
+    """
+    enqueued_at = time()
+    pending_key = f'{key_prefix}pending_jobs:{repo_name}'
+    pipeline = redis_connection.pipeline()
+    pipeline.hsetnx(pending_key, job_ref or f'{event_type}@{enqueued_at}',
+                    json.dumps({'event_type': event_type,
+                                'enqueued_at': enqueued_at,
+                                'job_ids': job_ids}))
+    pipeline.expire(pending_key, PENDING_JOBS_EXPIRY_SECONDS)
+    pipeline.execute()
+# end of record_jobs_enqueued function
+
+
+def pop_pending_jobs(redis_connection:StrictRedis, key_prefix:str, repo_name:str, callback_ref:Optional[str]) -> Optional[Dict[str,Any]]:
+    """
+    Finds (and forgets) the queued jobs that a callback for this repo is for, i.e.,
+        those for the commit that starts with callback_ref (from the callback identifier),
+        else the earliest ones queued for an event without a commit.
+
+    Returns the dict saved by record_jobs_enqueued, or None if there's no match
+        (including later callbacks for multi-part jobs, since only the first one claims the jobs).
+    """
+    pending_key = f'{key_prefix}pending_jobs:{repo_name}'
+    checked_at = time()
+    matched_fields, commitless_fields, stale_fields = [], [], []
+    pending_records = {}
+    for field, pending_json in redis_connection.hgetall(pending_key).items():
+        field = field.decode() if isinstance(field, bytes) else field
+        pending_records[field] = json.loads(pending_json)
+        if checked_at - pending_records[field]['enqueued_at'] > PENDING_JOBS_EXPIRY_SECONDS:
+            stale_fields.append(field)
+        elif callback_ref and field.startswith(callback_ref):
+            matched_fields.append(field)
+        elif '@' in field: # No commit
+            commitless_fields.append(field)
+    candidate_fields = matched_fields or commitless_fields
+    matched_field = min(candidate_fields, key=lambda field: pending_records[field]['enqueued_at']) \
+                        if candidate_fields else None
+    if matched_field is None and not stale_fields:
+        return None
+
+    pipeline = redis_connection.pipeline()
+    if matched_field is not None:
+        pipeline.hdel(pending_key, matched_field)
+    if stale_fields:
+        pipeline.hdel(pending_key, *stale_fields)
+    results = pipeline.execute()
+    if matched_field is None or not results[0]: # Another callback claimed it first
+        return None
+    return pending_records[matched_field]
+# end of pop_pending_jobs function
+
+
+def get_callback_latencies(redis_connection:StrictRedis, pending_jobs:Dict[str,Any],
+                            callback_queue_names:Collection[str]) -> List[Dict[str,Any]]:
+    """
+    Measures the latencies of the jobs (from pop_pending_jobs) that a callback is for.
+
+    Returns a list of dicts (one per queue) containing queue_name and event_type,
+        plus turnaround_seconds (from queuing until this callback) for the callback_queue_names
+        (i.e., the queues whose jobs lead to the callback -- others, like the catalog, don't),
+        and queue_wait_seconds and service_seconds if rq still knows about the job
+        (so not for the streams queue backend).
+    """
+    callback_at = time()
+    latencies = []
+    for queue_name, job_id in pending_jobs['job_ids'].items():
+        latency_dict = {'queue_name': queue_name,
+                        'event_type': pending_jobs['event_type'],
+                        }
+        if queue_name in callback_queue_names:
+            latency_dict['turnaround_seconds'] = callback_at - pending_jobs['enqueued_at']
+        job = None
+        if not STREAM_ENTRY_ID_REGEX.match(job_id): # Stream entries have no rq job to ask about
+            try:
+                # NOTE: rq only keeps the job (with its timestamps) for result_ttl (default 500s) after it finishes
+                job = Job.fetch(job_id, connection=redis_connection)
+            except NoSuchJobError:
+                pass
+        if job is not None:
+            enqueued_at = get_timestamp(job.enqueued_at) or pending_jobs['enqueued_at']
+            started_at = get_timestamp(job.started_at)
+            ended_at = get_timestamp(job.ended_at)
+            if started_at is not None:
+                latency_dict['queue_wait_seconds'] = max(started_at - enqueued_at, 0.0)
+                if ended_at is not None:
+                    latency_dict['service_seconds'] = max(ended_at - started_at, 0.0)
+        latencies.append(latency_dict)
+    return latencies
+# end of get_callback_latencies function
@@ -0,0 +1,125 @@
+# Added Oct 2026 so that we log compact, size-capped summaries of payloads
+#   rather than whole payloads (which can be hundreds of KB for large pushes).
+#   The summaries are only formatted if the log record is actually emitted.
+
+import os
+import logging
+from random import random
+from hashlib import sha1
+from typing import Dict, List, Any
+
+
+MAX_LOGGED_STRING_LENGTH = 80 # Longer strings (like commit messages) get truncated
+MAX_LOGGED_COMMIT_MESSAGES = 3
+MAX_LOGGED_REPR_LENGTH = int(os.getenv('MAX_LOGGED_REPR_LENGTH', '500'))
+
+
+def truncate(text:str, max_length:int=MAX_LOGGED_STRING_LENGTH) -> str:
+    """
+    Returns the text on a single line, truncated (with an ellipsis) if too long.
+    """
+    text = ' '.join(text.split()) # Remove newlines and excess whitespace
+    return text if len(text) <= max_length else f'{text[:max_length-1]}…'
+# end of truncate function
+
+
+def get_payload_digest(raw_data:Any) -> str:
+    """
+    Returns a short digest of the raw request data
+        (so that log lines can be matched to a particular delivery).
+    """
+    if isinstance(raw_data, str):
+        raw_data = raw_data.encode('utf-8')
+    elif not isinstance(raw_data, bytes):
+        raw_data = repr(raw_data).encode('utf-8')
+    return sha1(raw_data).hexdigest()[:12]
+# end of get_payload_digest function
+
+
+def get_commit_messages_summary(payload_json:Dict[str,Any]) -> str:
+    """
+    Returns the first few (truncated) commit messages from a push payload,
+        along with how many others there were.
+    """
+    try:
+        commits = payload_json['commits']
+        commit_messages:List[str] = [f'"{truncate(commit_dict["message"])}"'
+                                        for commit_dict in commits[:MAX_LOGGED_COMMIT_MESSAGES]]
+    except (KeyError, AttributeError, TypeError, IndexError):
+        return ''
+    if len(commits) > MAX_LOGGED_COMMIT_MESSAGES:
+        commit_messages.append(f'and {len(commits) - MAX_LOGGED_COMMIT_MESSAGES} more')
+    return ', '.join(commit_messages)
+# end of get_commit_messages_summary function
+
+
+class PayloadSummary:
+    """
+    A compact summary of a webhook payload for logging.
+
+    Pass it as a logging argument, e.g., logger.info("Payload: %s", PayloadSummary(…)),
+        so that the work is only done if the record is actually emitted.
+    """
+    def __init__(self, event_type:str, payload_json:Any, raw_data:Any) -> None:
+        self.event_type = event_type
+        self.payload_json = payload_json
+        self.raw_data = raw_data
+
+    def get_fields(self) -> Dict[str,Any]:
+        """
+        Returns a dict of the summary fields.
+        """
+        fields:Dict[str,Any] = {'event': self.event_type,
+                                'digest': get_payload_digest(self.raw_data),
+                                'bytes': len(self.raw_data) if isinstance(self.raw_data, (bytes,str)) else None}
+        if not isinstance(self.payload_json, dict):
+            fields['payload_type'] = type(self.payload_json).__name__
+            return fields
+        try:
+            fields['repo'] = self.payload_json['repository']['full_name']
+        except (KeyError, AttributeError, TypeError):
+            fields['repo'] = None
+        for payload_key in ('ref', 'action', 'ref_type'):
+            if isinstance(self.payload_json.get(payload_key), str):
+                fields[payload_key] = truncate(self.payload_json[payload_key])
+        if isinstance(self.payload_json.get('commits'), list):
+            fields['commits'] = len(self.payload_json['commits'])
+            fields['messages'] = get_commit_messages_summary(self.payload_json)
+        fields['keys'] = truncate(','.join(str(payload_key) for payload_key in self.payload_json))
+        return fields
+
+    def __str__(self) -> str:
+        return ' '.join(f'{field_name}={field_value}' for field_name, field_value in self.get_fields().items()
+                        if field_value not in (None, ''))
+# end of PayloadSummary class
+
+
+class TruncatedRepr:
+    """
+    Lazily gives a size-capped repr of any object for logging.
+    """
+    def __init__(self, some_object:Any, max_length:int=MAX_LOGGED_REPR_LENGTH) -> None:
+        self.some_object = some_object
+        self.max_length = max_length
+
+    def __str__(self) -> str:
+        object_repr = repr(self.some_object)
+        if len(object_repr) <= self.max_length:
+            return object_repr
+        return f'{object_repr[:self.max_length]}… ({len(object_repr):,} chars)'
+# end of TruncatedRepr class
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Only lets through the given fraction of DEBUG (and lower) records.
+
+    Records at INFO level and above always pass.
+    """
+    def __init__(self, sample_rate:float) -> None:
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random() < self.sample_rate
+# end of DebugSamplingFilter class
@@ -0,0 +1,201 @@
+# Added Oct 2026 so that the accepted events don't have to be queued as rq jobs
+#   (which have no replay or acknowledgement, and need a separate copy of the payload for each queue).
+#   The default is still rq, but with QUEUE_BACKEND=streams each accepted event
+#   is appended (once) to a Redis stream, and each downstream queue name becomes
+#   a consumer group on that stream.
+
+import os
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Set, Tuple, Any, Iterable
+
+# NOTE: We use StrictRedis() because we don't need the backwards compatibility of Redis()
+from redis import StrictRedis
+from redis.exceptions import ResponseError
+from rq import Queue, Worker
+
+
+STREAM_MAX_LENGTH = int(os.getenv('STREAM_MAX_LENGTH', '10000')) # Approximate number of entries kept in each stream
+
+
+class QueueBackend(ABC):
+    """
+    The interface for putting accepted events onto the downstream queues.
+
+    Each queued job is described by a dict with queue_name, function_name, and job_timeout entries.
+    """
+    name = ''
+
+    def prepare(self, redis_connection:StrictRedis, source_name:str, queue_names:Iterable[str]) -> None:
+        """
+        Get ready (e.g., at startup) to queue events from the source (e.g., 'webhook') onto the queues.
+
+        Nothing is needed by default.
+        """
+
+    @abstractmethod
+    def enqueue(self, redis_connection:StrictRedis, source_name:str, queue_jobs:List[Dict[str,Any]],
+                payload:Dict[str,Any]) -> Dict[str,str]:
+        """
+        Queues the payload for each of the queue_jobs.
+
+        Returns a dict of queue names to job ids.
+        """
+
+    @abstractmethod
+    def get_queue_length(self, redis_connection:StrictRedis, queue_name:str) -> int:
+        """
+        Returns the number of jobs waiting in the queue.
+        """
+
+    @abstractmethod
+    def get_worker_count(self, redis_connection:StrictRedis, queue_name:str) -> int:
+        """
+        Returns the number of workers taking jobs from the queue.
+        """
+# end of QueueBackend class
+
+
+class RqQueueBackend(QueueBackend):
+    """
+    Queues a separate rq job (with its own copy of the payload) onto each rq queue.
+    """
+    name = 'rq'
+
+    def enqueue(self, redis_connection:StrictRedis, source_name:str, queue_jobs:List[Dict[str,Any]],
+                payload:Dict[str,Any]) -> Dict[str,str]:
+        job_ids = {}
+        for queue_job in queue_jobs:
+            target_queue = Queue(queue_job['queue_name'], connection=redis_connection)
+            queued_job = target_queue.enqueue(queue_job['function_name'], payload, job_timeout=queue_job['job_timeout'])
+            job_ids[queue_job['queue_name']] = queued_job.id
+            # NOTE: The above enqueue can return a result from the job function. (By default, the result remains available for 500s.)
+        return job_ids
+
+    def get_queue_length(self, redis_connection:StrictRedis, queue_name:str) -> int:
+        return len(Queue(queue_name, connection=redis_connection))
+
+    def get_worker_count(self, redis_connection:StrictRedis, queue_name:str) -> int:
+        return Worker.count(queue=Queue(queue_name, connection=redis_connection))
+# end of RqQueueBackend class
+
+
+class StreamsQueueBackend(QueueBackend):
+    """
+    Appends each event once to the stream for its source, e.g., 'door43_webhook_stream',
+        with a 'targets' field listing the queue jobs that want it.
+
+    Each queue name is a consumer group on that stream, so each handler reads every entry
+        (skipping those that don't list its queue_name) and acknowledges it with XACK
+        -- unacknowledged entries can be claimed again (e.g., after a worker crash).
+
+    The streams are trimmed to approximately STREAM_MAX_LENGTH entries
+        so entries can be replayed for a while, but not if a group falls too far behind.
+
+    The groups are created (from the start of the stream) on each Redis shard
+        the first time that this process queues onto it (as well as at startup),
+        and again if the stream has disappeared (e.g., Redis restarted without persistence).
+    """
+    name = 'streams'
+
+    def __init__(self, stream_name_prefix:str, max_length:int=STREAM_MAX_LENGTH) -> None:
+        self.stream_name_prefix = stream_name_prefix
+        self.max_length = max_length
+        self.queue_stream_names:Dict[str,str] = {}
+        self.prepared_streams:Set[Tuple[int,str]] = set() # Connection ids and stream names
+
+    def get_stream_name(self, source_name:str) -> str:
+        return f'{self.stream_name_prefix}{source_name}_stream'
+
+    def prepare(self, redis_connection:StrictRedis, source_name:str, queue_names:Iterable[str]) -> None:
+        """
+        Remembers the queues for the source,
+            then creates the stream and a consumer group for each queue (if they don't already exist).
+        """
+        stream_name = self.get_stream_name(source_name)
+        for queue_name in queue_names:
+            self.queue_stream_names[queue_name] = stream_name
+        self.create_groups(redis_connection, stream_name)
+
+    def create_groups(self, redis_connection:StrictRedis, stream_name:str) -> None:
+        """
+        Creates the stream and the consumer groups for its queues (if they don't already exist).
+
+        New groups start from the beginning of the stream
+            (so that entries added while they were missing aren't lost to the handlers).
+        """
+        for queue_name, queue_stream_name in self.queue_stream_names.items():
+            if queue_stream_name != stream_name:
+                continue
+            try:
+                redis_connection.xgroup_create(stream_name, queue_name, id='0', mkstream=True)
+            except ResponseError as e:
+                if 'BUSYGROUP' not in str(e): # i.e., not just because it already exists
+                    raise
+        self.prepared_streams.add((id(redis_connection), stream_name))
+
+    def enqueue(self, redis_connection:StrictRedis, source_name:str, queue_jobs:List[Dict[str,Any]],
+                payload:Dict[str,Any]) -> Dict[str,str]:
+        stream_name = self.get_stream_name(source_name)
+        if (id(redis_connection), stream_name) not in self.prepared_streams: # e.g., the shard was down at startup
+            self.create_groups(redis_connection, stream_name)
+        entry_fields:Dict[Any,Any] = {'payload': json.dumps(payload, default=str),
+                                      'targets': json.dumps(queue_jobs),
+                                      'enqueued_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                                      }
+        # NOTE: NOMKSTREAM (needs Redis 6.2) means that a missing stream isn't created without its groups
+        entry_id = redis_connection.xadd(stream_name, entry_fields,
+                                         maxlen=self.max_length, approximate=True, nomkstream=True)
+        if entry_id is None: # The stream has gone (e.g., Redis restarted without persistence)
+            self.create_groups(redis_connection, stream_name)
+            entry_id = redis_connection.xadd(stream_name, entry_fields,
+                                             maxlen=self.max_length, approximate=True, nomkstream=True)
+        if isinstance(entry_id, bytes):
+            entry_id = entry_id.decode()
+        return {queue_job['queue_name']:entry_id for queue_job in queue_jobs}
+
+    def get_group_info(self, redis_connection:StrictRedis, queue_name:str) -> Dict[str,Any]:
+        """
+        Returns the XINFO GROUPS dict for the queue's consumer group (empty if it doesn't exist yet).
+        """
+        try:
+            group_dicts = redis_connection.xinfo_groups(self.queue_stream_names[queue_name])
+        except (KeyError, ResponseError): # Unknown queue or no stream yet
+            return {}
+        for group_dict in group_dicts:
+            group_name = group_dict['name']
+            if (group_name.decode() if isinstance(group_name, bytes) else group_name) == queue_name:
+                return group_dict
+        return {}
+
+    def get_queue_length(self, redis_connection:StrictRedis, queue_name:str) -> int:
+        """
+        Returns the number of entries not yet read by the group (needs Redis 7 to know this)
+            plus those read but not yet acknowledged.
+
+        NOTE: This includes any entries that the group will skip because they're for other queues.
+        """
+        group_dict = self.get_group_info(redis_connection, queue_name)
+        return (group_dict.get('lag') or 0) + (group_dict.get('pending') or 0)
+
+    def get_worker_count(self, redis_connection:StrictRedis, queue_name:str) -> int:
+        """
+        Returns the number of consumers in the group (which includes any that have stopped).
+        """
+        return self.get_group_info(redis_connection, queue_name).get('consumers') or 0
+# end of StreamsQueueBackend class
+
+
+def get_queue_backend(backend_name:str, stream_name_prefix:str) -> QueueBackend:
+    """
+    Returns the queue backend with the given name.
+
+    Raises ValueError for an unknown name.
+    """
+    if backend_name == RqQueueBackend.name:
+        return RqQueueBackend()
+    if backend_name == StreamsQueueBackend.name:
+        return StreamsQueueBackend(stream_name_prefix)
+    raise ValueError(f"Unknown queue backend '{backend_name}' -- expected '{RqQueueBackend.name}' or '{StreamsQueueBackend.name}'")
+# end of get_queue_backend function
@@ -0,0 +1,164 @@
+# Added Oct 2026 to allow the queues to be spread across several Redis instances
+#   Jobs are placed on a shard chosen by consistent hashing of the repo name
+#       so that all jobs for any one repo stay in order on the same Redis instance.
+
+import os
+from time import time
+from bisect import bisect
+from hashlib import md5
+from typing import List, Tuple, Optional, Callable, Iterator, Any
+
+# NOTE: We use StrictRedis() because we don't need the backwards compatibility of Redis()
+from redis import StrictRedis
+from redis import exceptions as redis_exceptions
+
+
+DEFAULT_REDIS_PORT = 6379
+SHARD_REPLICA_COUNT = 64 # Number of points on the hash ring for each shard (smooths out the distribution)
+SHARD_RETRY_SECONDS = int(os.getenv('REDIS_SHARD_RETRY_SECONDS', '30')) # How long a failed shard is avoided before we try it again
+SHARD_CONNECT_TIMEOUT = float(os.getenv('REDIS_SHARD_CONNECT_TIMEOUT', '5')) # Seconds -- so that a dead shard doesn't hang our request
+SHARD_SOCKET_TIMEOUT = float(os.getenv('REDIS_SHARD_SOCKET_TIMEOUT', '10')) # Seconds -- so that a hung shard (connected but not answering) doesn't either
+REDIS_CONNECTION_ERRORS = (redis_exceptions.ConnectionError, redis_exceptions.TimeoutError)
+
+
+def get_shard_hostnames(hostnames_string:str, default_hostname:str) -> List[str]:
+    """
+    Splits a comma-separated list of Redis 'hostname' or 'hostname:port' entries.
+
+    Returns a list containing only the default hostname if the string is empty.
+    """
+    hostnames = [hostname.strip() for hostname in hostnames_string.split(',') if hostname.strip()]
+    return hostnames if hostnames else [default_hostname]
+# end of get_shard_hostnames function
+
+
+def get_hash_position(key:str) -> int:
+    """
+    Returns the position of the key on the hash ring.
+
+    NOTE: We can't use the builtin hash() because it's randomised per process
+            and all of our gunicorn workers must agree on the ring positions.
+    """
+    return int(md5(key.encode('utf-8')).hexdigest()[:16], 16)
+# end of get_hash_position function
+
+
+class RedisShard:
+    """
+    One Redis instance that we can place jobs on,
+        along with its current health state.
+    """
+    def __init__(self, hostname:str) -> None:
+        self.name = hostname
+        host, _, port_string = hostname.partition(':')
+        self.connection = StrictRedis(host=host, port=int(port_string) if port_string else DEFAULT_REDIS_PORT,
+                                        socket_connect_timeout=SHARD_CONNECT_TIMEOUT,
+                                        socket_timeout=SHARD_SOCKET_TIMEOUT) # Also bounds the recovery ping in is_available()
+        self.stats_name = hostname.replace('.', '_').replace(':', '_') # Graphite uses dots as separators
+        self.down_until:Optional[float] = None # Set when we've found this shard to be failing
+
+    def mark_down(self) -> None:
+        """
+        Avoid this shard for a while.
+        """
+        self.down_until = time() + SHARD_RETRY_SECONDS
+
+    def is_available(self) -> bool:
+        """
+        Returns True if the shard is believed to be working.
+
+        Once the retry time has passed, the shard is pinged to see if it has recovered.
+        """
+        if self.down_until is None:
+            return True
+        if time() < self.down_until:
+            return False
+        try:
+            self.connection.ping()
+        except REDIS_CONNECTION_ERRORS:
+            self.mark_down()
+            return False
+        self.down_until = None
+        return True
+
+    def __repr__(self) -> str:
+        return f"RedisShard('{self.name}'{'' if self.down_until is None else ' DOWN'})"
+# end of RedisShard class
+
+
+class RedisShardRing:
+    """
+    A consistent hash ring of Redis shards.
+
+    With only one shard, everything simply goes to that shard.
+    """
+    def __init__(self, hostnames:List[str]) -> None:
+        self.shards = [RedisShard(hostname) for hostname in hostnames]
+        self.ring:List[Tuple[int,int]] = sorted((get_hash_position(f'{shard.name}#{replica_number}'), shard_index)
+                                                for shard_index, shard in enumerate(self.shards)
+                                                for replica_number in range(SHARD_REPLICA_COUNT))
+        self.ring_positions = [position for position, _shard_index in self.ring]
+
+    def get_shards_for_key(self, key:Optional[str]) -> Iterator[RedisShard]:
+        """
+        Yields each shard once in ring order starting from the owner of the key.
+
+        A missing key always starts at the first shard.
+        """
+        if key is None:
+            yield from self.shards
+            return
+        start_index = bisect(self.ring_positions, get_hash_position(key))
+        yielded_indices = set()
+        for ring_offset in range(len(self.ring)):
+            _position, shard_index = self.ring[(start_index + ring_offset) % len(self.ring)]
+            if shard_index not in yielded_indices:
+                yielded_indices.add(shard_index)
+                yield self.shards[shard_index]
+                if len(yielded_indices) == len(self.shards):
+                    return
+
+    def get_shard(self, key:Optional[str]) -> RedisShard:
+        """
+        Returns the first available shard for the key.
+
+        If no shard is available, returns the owner of the key anyway
+            (so that the caller gets the Redis exception).
+        """
+        owner_shard = None
+        for shard in self.get_shards_for_key(key):
+            if owner_shard is None:
+                owner_shard = shard
+            if shard.is_available():
+                return shard
+        assert owner_shard is not None
+        return owner_shard
+
+    def run_on_shard(self, key:Optional[str], function:Callable[[StrictRedis],Any], logger) -> Tuple[RedisShard,Any]:
+        """
+        Calls the function with the connection of the shard for the key,
+            failing over to the next shard on the ring if Redis can't be reached.
+
+        Returns a 2-tuple: the shard that was used and the result of the function.
+        """
+        last_error:Optional[Exception] = None
+        for shard in self.get_shards_for_key(key):
+            if not shard.is_available():
+                continue
+            try:
+                return shard, function(shard.connection)
+            except REDIS_CONNECTION_ERRORS as e:
+                logger.critical(f"Redis shard '{shard.name}' failed with {e!r} -- marking it as down")
+                shard.mark_down()
+                last_error = e
+        if last_error is None: # All the shards were already marked down, so try the owner anyway
+            shard = self.get_shard(key)
+            return shard, function(shard.connection)
+        raise last_error
+
+    def get_available_shards(self) -> List[RedisShard]:
+        """
+        Returns the list of shards that are currently believed to be working.
+        """
+        return [shard for shard in self.shards if shard.is_available()]
+# end of RedisShardRing class
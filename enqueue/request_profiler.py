@@ -0,0 +1,179 @@
+# Added Oct 2026 so that we can profile the request handlers in place (e.g., when latency spikes in production)
+#   A sample of requests (optionally only the slow ones) are profiled with cProfile,
+#   and the profiles are aggregated by route and event type and regularly written to disk.
+#   When the sample rate is zero, the only overhead is one comparison per request.
+
+import os
+import re
+import cProfile
+import pstats
+from glob import glob
+from time import time, perf_counter
+from random import random
+from threading import Lock
+from functools import wraps
+from typing import Dict, List, Callable, Any, Optional
+
+
+PROFILE_DUMP_EVERY = 10 # Write the aggregated profile to disk after this many more profiles in that group
+PROFILE_SETTINGS_REFRESH_SECONDS = 30 # How often to check for changed (shared) settings
+
+
+class RequestProfiler:
+    """
+    Profiles a sample of requests and aggregates the profiles
+        in groups (e.g., by route and event type).
+    """
+    def __init__(self, sample_rate:float, slow_seconds:float, dirpath:str) -> None:
+        self.sample_rate = sample_rate # 0 means disabled, 1 means profile every request
+        self.slow_seconds = slow_seconds # Only keep profiles of requests taking at least this long
+        self.dirpath = dirpath
+        self.group_stats:Dict[str,pstats.Stats] = {}
+        self.group_counts:Dict[str,int] = {}
+        self.lock = Lock()
+        self.profiling_lock = Lock() # Python 3.12+ only allows one active profiler (e.g., across gthread workers)
+        self.get_shared_settings:Optional[Callable[[],Optional[Dict[str,float]]]] = None
+        self.settings_checked_at = 0.0
+
+    def update_settings(self, sample_rate:Optional[float]=None, slow_seconds:Optional[float]=None) -> None:
+        """
+        Change the sample rate and/or slow threshold (e.g., from an admin request).
+        """
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if slow_seconds is not None:
+            self.slow_seconds = max(float(slow_seconds), 0.0)
+
+    def refresh_settings(self) -> None:
+        """
+        Every so often, fetch the settings that might have been changed
+            by an admin request handled in another (gunicorn worker) process.
+        """
+        if self.get_shared_settings is None \
+        or time() - self.settings_checked_at < PROFILE_SETTINGS_REFRESH_SECONDS:
+            return
+        self.settings_checked_at = time()
+        try:
+            shared_settings = self.get_shared_settings()
+        except Exception: # Profiling must never break the request
+            return
+        if shared_settings:
+            self.update_settings(shared_settings.get('sample_rate'), shared_settings.get('slow_seconds'))
+
+    def profiled(self, route_name:str, get_detail:Callable[[],str]) -> Callable:
+        """
+        Decorator to profile (a sample of) calls to a request handler.
+
+        The profile is grouped by the route name and the detail (e.g., the event type),
+            which is only requested if the profile is kept.
+        """
+        def decorator(function:Callable) -> Callable:
+            @wraps(function)
+            def wrapper(*args, **kwargs) -> Any:
+                self.refresh_settings()
+                if not self.sample_rate or random() >= self.sample_rate:
+                    return function(*args, **kwargs)
+                profile = self.start_profile()
+                if profile is None: # Another request is being profiled
+                    return function(*args, **kwargs)
+                start_time = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.stop_profile(profile, route_name, get_detail, perf_counter() - start_time)
+            return wrapper
+        return decorator
+
+    def start_profile(self) -> Optional[cProfile.Profile]:
+        """
+        Starts a profile unless one is already active (in this process).
+
+        Returns the profile, or None if profiling isn't possible now.
+        """
+        if not self.profiling_lock.acquire(blocking=False):
+            return None
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+        except Exception: # e.g., ValueError if another profiling tool is already active
+            self.profiling_lock.release()
+            return None
+        return profile
+
+    def stop_profile(self, profile:cProfile.Profile, route_name:str, get_detail:Callable[[],str], elapsed_seconds:float) -> None:
+        """
+        Stops the profile and keeps it if the request was slow enough.
+        """
+        try:
+            profile.disable()
+        except Exception: # Profiling must never break the request
+            return
+        finally:
+            self.profiling_lock.release()
+        if elapsed_seconds >= self.slow_seconds:
+            try:
+                self.add_profile(f'{route_name}-{get_detail()}', profile)
+            except Exception: # e.g., the profile couldn't be written to disk
+                pass
+
+    def add_profile(self, group_name:str, profile:cProfile.Profile) -> None:
+        """
+        Add the profile to the aggregated stats for the group
+            and write them to disk every so often.
+        """
+        group_name = re.sub(r'[^\w.-]', '_', group_name) # Make it safe for a filename
+        with self.lock:
+            if group_name in self.group_stats:
+                self.group_stats[group_name].add(profile)
+            else:
+                self.group_stats[group_name] = pstats.Stats(profile)
+            self.group_counts[group_name] = self.group_counts.get(group_name, 0) + 1
+            if self.group_counts[group_name] % PROFILE_DUMP_EVERY == 1: # Including the first one
+                self.dump_group(group_name)
+
+    def dump_group(self, group_name:str) -> None:
+        """
+        Write the aggregated stats for the group to disk
+            (one file per process so that gunicorn workers don't overwrite each other).
+        """
+        os.makedirs(self.dirpath, exist_ok=True)
+        self.group_stats[group_name].dump_stats(os.path.join(self.dirpath, f'{group_name}.{os.getpid()}.prof'))
+
+    def get_summary(self, top_count:int=10) -> Dict[str,Any]:
+        """
+        Returns the top hotspots (by own time) of each group,
+            aggregated from the profiles written to disk by all processes.
+        """
+        with self.lock:
+            for group_name in self.group_stats:
+                self.dump_group(group_name) # So that the summary is up-to-date for this process
+        summary_dict:Dict[str,Any] = {}
+        for profile_filepath in sorted(glob(os.path.join(self.dirpath, '*.prof'))):
+            group_name = os.path.basename(profile_filepath).rsplit('.', 2)[0]
+            try:
+                if group_name in summary_dict:
+                    summary_dict[group_name].add(profile_filepath)
+                else:
+                    summary_dict[group_name] = pstats.Stats(profile_filepath)
+            except (OSError, EOFError, TypeError, ValueError):
+                continue # Probably being written by another process
+        return {group_name: {'total_seconds': round(group_stats.total_tt, 3), # type: ignore[attr-defined]
+                             'hotspots': get_hotspots(group_stats, top_count)}
+                for group_name, group_stats in summary_dict.items()}
+# end of RequestProfiler class
+
+
+def get_hotspots(stats:pstats.Stats, top_count:int) -> List[Dict[str,Any]]:
+    """
+    Returns a list of the functions that took the most time themselves.
+    """
+    hotspots = []
+    for (filepath, line_number, function_name), (_primitive_calls, call_count, own_seconds, cumulative_seconds, _callers) \
+            in sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top_count]: # type: ignore[attr-defined]
+        hotspots.append({'function': f'{os.path.basename(filepath)}:{line_number}({function_name})',
+                         'calls': call_count,
+                         'own_seconds': round(own_seconds, 6),
+                         'cumulative_seconds': round(cumulative_seconds, 6),
+                         })
+    return hotspots
+# end of get_hotspots function
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# Added Oct 2026 to find out how many webhooks per second the enqueue stack
+#   (nginx/gunicorn/Flask plus Redis, e.g., from `make composeEnqueueRedis`) can handle.
+#
+# This is a closed-loop load generator: each simulated client sends its next request
+#   as soon as it gets the response to the previous one. The number of clients is
+#   stepped up (ramped) and throughput, latency percentiles, and error rates are
+#   reported for each step.
+#
+# NOTE: Only uses the standard library so it can be run from anywhere.
+# NOTE: Valid payloads WILL be queued, so only run this against a local test stack
+#           (and set RESTRICT_DCS_URL=False if the payloads aren't from DCS_URL).
+
+import sys
+import json
+import argparse
+from math import ceil
+from time import perf_counter
+from threading import Thread, Lock
+from itertools import cycle
+from urllib import request as urllib_request
+from urllib.error import HTTPError, URLError
+from typing import Dict, List, Tuple, Any, Iterator
+
+
+DEFAULT_URL = 'http://127.0.0.1:8080/'
+DEFAULT_CONCURRENCY_STEPS = '1,2,4,8,16,32'
+DEFAULT_STEP_SECONDS = 30.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+
+def load_corpus(filepaths:List[str], default_event_type:str) -> List[Tuple[Dict[str,str],bytes]]:
+    """
+    Loads the recorded payloads to be replayed.
+
+    A .json file contains one payload.
+    A .jsonl file contains one payload per line -- a line may also be a dict
+        with 'headers' and 'payload' entries so that the X-Gitea-Event can vary.
+
+    Returns a list of 2-tuples: headers dict and encoded payload.
+    """
+    recorded_dicts:List[Any] = []
+    for filepath in filepaths:
+        with open(filepath, 'rt') as corpus_file:
+            if filepath.endswith('.jsonl'):
+                recorded_dicts.extend(json.loads(line) for line in corpus_file if line.strip())
+            else:
+                recorded_dicts.append(json.load(corpus_file))
+
+    corpus = []
+    for recorded_dict in recorded_dicts:
+        headers = {'Content-Type': 'application/json', 'X-Gitea-Event': default_event_type}
+        if isinstance(recorded_dict, dict) and 'payload' in recorded_dict:
+            headers.update(recorded_dict.get('headers', {}))
+            recorded_dict = recorded_dict['payload']
+        corpus.append((headers, json.dumps(recorded_dict).encode('utf-8')))
+    if not corpus:
+        raise ValueError(f"No payloads found in {filepaths}")
+    return corpus
+# end of load_corpus function
+
+
+def get_percentile(sorted_values:List[float], percentile:float) -> float:
+    """
+    Returns the nearest-rank percentile of an already sorted list (0 if empty).
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(ceil(percentile / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+# end of get_percentile function
+
+
+class LoadStep:
+    """
+    Runs one step of the load test with a fixed number of closed-loop clients.
+    """
+    def __init__(self, url:str, corpus:List[Tuple[Dict[str,str],bytes]], concurrency:int, step_seconds:float) -> None:
+        self.url = url
+        self.concurrency = concurrency
+        self.step_seconds = step_seconds
+        self.corpus_iterator:Iterator[Tuple[Dict[str,str],bytes]] = cycle(corpus)
+        self.lock = Lock()
+        self.latencies:List[float] = []
+        self.status_counts:Dict[str,int] = {}
+
+    def get_next_request(self) -> Tuple[Dict[str,str],bytes]:
+        with self.lock:
+            return next(self.corpus_iterator)
+
+    def record_response(self, status:str, latency_seconds:float) -> None:
+        with self.lock:
+            self.latencies.append(latency_seconds)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def run_client(self, end_time:float) -> None:
+        while perf_counter() < end_time:
+            headers, payload_bytes = self.get_next_request()
+            post_request = urllib_request.Request(self.url, data=payload_bytes, headers=headers, method='POST')
+            start_time = perf_counter()
+            try:
+                with urllib_request.urlopen(post_request, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+                    response.read()
+                    status = str(response.status)
+            except HTTPError as e:
+                status = str(e.code) # e.g., 400 for payloads that we reject
+            except (URLError, OSError) as e:
+                status = type(e).__name__
+            self.record_response(status, perf_counter() - start_time)
+
+    def run(self) -> Dict[str,Any]:
+        """
+        Runs the clients for the step duration.
+
+        Returns a dict of the results.
+        """
+        start_time = perf_counter()
+        end_time = start_time + self.step_seconds
+        client_threads = [Thread(target=self.run_client, args=(end_time,), daemon=True) for _n in range(self.concurrency)]
+        for client_thread in client_threads:
+            client_thread.start()
+        for client_thread in client_threads:
+            client_thread.join()
+        elapsed_seconds = perf_counter() - start_time
+
+        sorted_latencies = sorted(self.latencies)
+        request_count = len(sorted_latencies)
+        rejected_count = sum(status_count for status, status_count in self.status_counts.items() if status.startswith('4'))
+        error_count = sum(status_count for status, status_count in self.status_counts.items()
+                            if not status.startswith('2') and not status.startswith('4'))
+        return {'concurrency': self.concurrency,
+                'requests': request_count,
+                'throughput': request_count / elapsed_seconds,
+                'p50_ms': get_percentile(sorted_latencies, 50) * 1000,
+                'p95_ms': get_percentile(sorted_latencies, 95) * 1000,
+                'p99_ms': get_percentile(sorted_latencies, 99) * 1000,
+                'rejected_rate': rejected_count / request_count if request_count else 0.0,
+                'error_rate': error_count / request_count if request_count else 0.0,
+                'statuses': dict(sorted(self.status_counts.items())),
+                }
+# end of LoadStep class
+
+
+def main() -> None:
+    """
+    Parse the command line, then run and report each load step.
+    """
+    parser = argparse.ArgumentParser(description="Replay recorded webhook payloads against a local enqueue stack")
+    parser.add_argument('corpus_filepaths', nargs='+', help=".json (one payload) or .jsonl (one per line) files")
+    parser.add_argument('--url', default=DEFAULT_URL, help=f"webhook URL (default {DEFAULT_URL})")
+    parser.add_argument('--event', default='push', help="X-Gitea-Event header if not given in the corpus (default push)")
+    parser.add_argument('--concurrency', default=DEFAULT_CONCURRENCY_STEPS,
+                        help=f"comma-separated numbers of clients to ramp through (default {DEFAULT_CONCURRENCY_STEPS})")
+    parser.add_argument('--step-seconds', type=float, default=DEFAULT_STEP_SECONDS,
+                        help=f"how long to run each step (default {DEFAULT_STEP_SECONDS})")
+    parser.add_argument('--label', default='', help="name of the gunicorn worker model being tested, e.g., 'sync-4'")
+    parser.add_argument('--results-filepath', help="optional .jsonl file to append the results to")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus_filepaths, args.event)
+    concurrency_steps = [int(concurrency) for concurrency in args.concurrency.split(',')]
+    print(f"Replaying {len(corpus)} payloads to {args.url}{f' for {args.label!r}' if args.label else ''}")
+    print(f"{'clients':>7} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rejected':>8} {'errors':>8}")
+    for concurrency in concurrency_steps:
+        results = LoadStep(args.url, corpus, concurrency, args.step_seconds).run()
+        results['label'] = args.label
+        print(f"{results['concurrency']:>7} {results['requests']:>8} {results['throughput']:>8.1f} " \
+              f"{results['p50_ms']:>8.1f} {results['p95_ms']:>8.1f} {results['p99_ms']:>8.1f} " \
+              f"{results['rejected_rate']:>8.1%} {results['error_rate']:>8.1%}")
+        if args.results_filepath:
+            with open(args.results_filepath, 'at') as results_file:
+                results_file.write(json.dumps(results) + '\n')
+        sys.stdout.flush()
+# end of main function
+
+
+if __name__ == '__main__':
+    main()
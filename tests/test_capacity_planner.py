@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from enqueue.capacity_planner import get_capacity_estimate, TARGET_UTILIZATION, MIN_RECOMMENDED_WORKERS
+
+
+class TestCapacityPlanner(TestCase):
+
+    def test_idle(self):
+        capacity_dict = get_capacity_estimate(0, 60, 0, 2)
+        self.assertEqual(capacity_dict['recommended_worker_count'], MIN_RECOMMENDED_WORKERS)
+        self.assertEqual(capacity_dict['drain_seconds'], 0)
+
+    def test_steady_load(self):
+        # Ten jobs a minute taking a minute each keeps ten workers busy
+        capacity_dict = get_capacity_estimate(10, 60, 0, 10)
+        self.assertEqual(capacity_dict['utilization'], 1.0)
+        self.assertGreaterEqual(capacity_dict['recommended_worker_count'], 10 / TARGET_UTILIZATION)
+
+    def test_backlog_draining(self):
+        # Four workers doing a job a minute each, with one arrival a minute, clear 3 jobs a minute
+        capacity_dict = get_capacity_estimate(1, 60, 30, 4)
+        self.assertEqual(capacity_dict['drain_seconds'], 600)
+
+    def test_backlog_growing(self):
+        capacity_dict = get_capacity_estimate(10, 60, 30, 4)
+        self.assertIsNone(capacity_dict['drain_seconds'])
+        self.assertGreater(capacity_dict['recommended_worker_count'], 10)
+
+    def test_no_workers(self):
+        capacity_dict = get_capacity_estimate(1, 60, 5, 0)
+        self.assertIsNone(capacity_dict['drain_seconds'])
+        self.assertIsNone(capacity_dict['utilization'])
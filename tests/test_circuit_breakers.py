@@ -0,0 +1,80 @@
+from unittest import TestCase
+from unittest.mock import Mock
+from time import sleep
+import logging
+import warnings
+
+import boto3
+from botocore.stub import Stubber
+import watchtower
+
+from enqueue.circuit_breakers import CircuitBreaker, GuardedCloudWatchLogHandler, CLOSED, OPEN
+
+
+def failing_function():
+    raise ConnectionError("Backend is down")
+
+
+class TestCircuitBreakers(TestCase):
+
+    def test_trips_on_errors(self):
+        breaker = CircuitBreaker('test', latency_threshold=1.0, failure_threshold=3, reset_seconds=60)
+        for _n in range(3):
+            self.assertIsNone(breaker.call(failing_function))
+        self.assertEqual(breaker.state, OPEN)
+        mock_function = Mock(return_value='sent')
+        self.assertIsNone(breaker.call(mock_function)) # Shed
+        mock_function.assert_not_called()
+        self.assertEqual(breaker.get_state_dict()['shed_count'], 1)
+
+    def test_trips_on_latency(self):
+        breaker = CircuitBreaker('test', latency_threshold=0.0, failure_threshold=2, reset_seconds=60)
+        breaker.call(lambda: 'slow')
+        breaker.call(lambda: 'slow')
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_probe_recovers(self):
+        breaker = CircuitBreaker('test', latency_threshold=1.0, failure_threshold=1, reset_seconds=0.01)
+        breaker.call(failing_function)
+        self.assertEqual(breaker.state, OPEN)
+        sleep(0.02)
+        self.assertEqual(breaker.call(lambda: 'sent'), 'sent')
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.get_state_dict()['trip_count'], 1)
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('test', latency_threshold=1.0, failure_threshold=5, reset_seconds=0.01)
+        for _n in range(5):
+            breaker.call(failing_function)
+        sleep(0.02)
+        breaker.call(failing_function)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_guarded_cloudwatch_handler(self):
+        breaker = CircuitBreaker('test', latency_threshold=1.0, failure_threshold=1, reset_seconds=60)
+        logs_client = boto3.client('logs', region_name='us-west-2',
+                                   aws_access_key_id='testing', aws_secret_access_key='testing')
+        with Stubber(logs_client) as stubber:
+            stubber.add_client_error('put_log_events', service_error_code='ThrottlingException', http_status_code=400)
+            log_handler = GuardedCloudWatchLogHandler(breaker, boto3_client=logs_client, log_group_name='test',
+                                                      use_queues=False, create_log_group=False)
+            record = logging.LogRecord('test', logging.INFO, __file__, 1, 'msg', None, None)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', watchtower.WatchtowerWarning)
+                log_handler.emit(record) # Throttled (and the retries fail fast)
+                self.assertEqual(breaker.state, OPEN)
+                log_handler.emit(record) # Dropped
+            stubber.assert_no_pending_responses()
+        self.assertEqual(breaker.get_state_dict()['shed_count'], 1)
+
+    def test_slow_cloudwatch_trips(self):
+        breaker = CircuitBreaker('test', latency_threshold=0.0, failure_threshold=1, reset_seconds=60)
+        logs_client = boto3.client('logs', region_name='us-west-2',
+                                   aws_access_key_id='testing', aws_secret_access_key='testing')
+        with Stubber(logs_client) as stubber:
+            stubber.add_response('put_log_events', {'nextSequenceToken': 'next'})
+            log_handler = GuardedCloudWatchLogHandler(breaker, boto3_client=logs_client, log_group_name='test',
+                                                      use_queues=False, create_log_group=False)
+            log_handler.emit(logging.LogRecord('test', logging.INFO, __file__, 1, 'msg', None, None))
+            stubber.assert_no_pending_responses()
+        self.assertEqual(breaker.state, OPEN)
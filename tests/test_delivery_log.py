@@ -0,0 +1,43 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import json
+
+from enqueue.delivery_log import DeliveryRecord, save_delivery, get_recent_deliveries, RECENT_DELIVERIES_LENGTH
+
+
+class TestDeliveryLog(TestCase):
+
+    def test_record(self):
+        headers = {'X-Gitea-Event': 'push', 'X-Gitea-Signature': 'secret', 'User-Agent': 'GiteaServer'}
+        delivery = DeliveryRecord('webhook', headers)
+        delivery.end_stage('precheck')
+        delivery.end_stage('payload_check')
+        delivery.job_ids = {'door43_job_handler': 'abc123'}
+        delivery_dict = delivery.get_dict(400, 'invalid', "Bad\nerror")
+        self.assertEqual(delivery_dict['headers'], {'X-Gitea-Event': 'push', 'User-Agent': 'GiteaServer'})
+        self.assertEqual(list(delivery_dict['stage_ms']), ['precheck', 'payload_check'])
+        self.assertEqual(delivery_dict['outcome'], 'invalid')
+        self.assertEqual(delivery_dict['error'], 'Bad error')
+        self.assertGreaterEqual(delivery_dict['total_ms'], sum(delivery_dict['stage_ms'].values()))
+        json.dumps(delivery_dict) # Must be serializable
+
+    def test_save_trims(self):
+        redis_connection = Mock()
+        pipeline = redis_connection.pipeline.return_value
+        save_delivery(redis_connection, 'prefix:', {'route': 'callback'})
+        pipeline.lpush.assert_called_once_with('prefix:deliveries:callback', '{"route": "callback"}')
+        pipeline.ltrim.assert_called_once_with('prefix:deliveries:callback', 0, RECENT_DELIVERIES_LENGTH - 1)
+        pipeline.execute.assert_called_once()
+
+    def test_get_recent(self):
+        redis_connection = Mock()
+        redis_connection.lrange.return_value = [b'{"route": "webhook", "status_code": 200}']
+        self.assertEqual(get_recent_deliveries(redis_connection, 'prefix:', 'webhook', 5),
+                            [{'route': 'webhook', 'status_code': 200}])
+        redis_connection.lrange.assert_called_once_with('prefix:deliveries:webhook', 0, 4)
+
+    def test_count_is_at_least_one(self):
+        redis_connection = Mock(**{'lrange.return_value': ['{"route": "webhook"}']})
+        for count in (0, -5):
+            self.assertEqual(get_recent_deliveries(redis_connection, 'prefix:', 'webhook', count), [{'route': 'webhook'}])
+            redis_connection.lrange.assert_called_with('prefix:deliveries:webhook', 0, 0)
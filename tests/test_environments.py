@@ -0,0 +1,27 @@
+from unittest import TestCase
+
+from enqueue.environments import get_environment_path_segment, parse_environment_hostnames, select_environment_prefix
+
+
+class TestEnvironments(TestCase):
+
+    def test_path_segments(self):
+        self.assertEqual(get_environment_path_segment(''), 'prod/')
+        self.assertEqual(get_environment_path_segment('dev-'), 'dev/')
+
+    def test_parse_hostnames(self):
+        self.assertEqual(parse_environment_hostnames('', ['', 'dev-']), {})
+        self.assertEqual(parse_environment_hostnames('API.door43.org=, dev-api.door43.org=dev-', ['', 'dev-']),
+                            {'api.door43.org': '', 'dev-api.door43.org': 'dev-'})
+        with self.assertRaises(ValueError):
+            parse_environment_hostnames('dev-api.door43.org', ['', 'dev-'])
+        with self.assertRaises(ValueError):
+            parse_environment_hostnames('test-api.door43.org=test-', ['', 'dev-'])
+
+    def test_select_prefix(self):
+        hostnames = {'dev-api.door43.org': 'dev-'}
+        self.assertEqual(select_environment_prefix('/dev/tx-callback/', 'api.door43.org', ['', 'dev-'], hostnames, ''), 'dev-')
+        self.assertEqual(select_environment_prefix('/prod/', 'dev-api.door43.org', ['', 'dev-'], hostnames, ''), '')
+        self.assertEqual(select_environment_prefix('/', 'DEV-API.door43.org:8080', ['', 'dev-'], hostnames, ''), 'dev-')
+        self.assertEqual(select_environment_prefix('/', 'localhost', ['', 'dev-'], hostnames, 'dev-'), 'dev-')
+        self.assertEqual(select_environment_prefix('/developer/', 'localhost', ['', 'dev-'], {}, ''), '')
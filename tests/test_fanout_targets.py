@@ -0,0 +1,81 @@
+from unittest import TestCase
+import json
+
+from enqueue.fanout_targets import load_fanout_table, get_fanout_targets
+
+
+FANOUT_TABLE = [
+    {
+        'queue_name': 'door43_job_handler',
+        'function_name': 'webhook.job',
+        'stats_name': 'enqueue-job',
+    },
+    {
+        'queue_name': 'door43_catalog_job_handler',
+        'function_name': 'webhook.job',
+        'stats_name': 'enqueue-catalog-job',
+        'event_types': ['push', 'release'],
+        'excluded_repo_owners': ['tx-manager-test-data'],
+        'push_ref_pattern': r'^refs/heads/{default_branch}$',
+    },
+]
+
+
+def get_queue_names(event_type, payload_json):
+    return [fanout_entry['queue_name'] for fanout_entry in get_fanout_targets(FANOUT_TABLE, event_type, payload_json)]
+
+
+class TestFanoutTargets(TestCase):
+
+    def test_load_table(self):
+        self.assertEqual(load_fanout_table(json.dumps(FANOUT_TABLE)), FANOUT_TABLE)
+
+    def test_load_bad_tables(self):
+        with self.assertRaises(ValueError):
+            load_fanout_table('{}')
+        with self.assertRaises(ValueError):
+            load_fanout_table('[{"queue_name": "door43_job_handler"}]')
+        with self.assertRaises(ValueError):
+            load_fanout_table(json.dumps([{**FANOUT_TABLE[0], 'whatever': True}]))
+
+    def test_default_branch_push(self):
+        payload_json = {
+            'ref': 'refs/heads/main',
+            'repository': {'default_branch': 'main', 'owner': {'username': 'unfoldingWord'}},
+            }
+        self.assertEqual(get_queue_names('push', payload_json), ['door43_job_handler', 'door43_catalog_job_handler'])
+
+    def test_other_branch_push(self):
+        payload_json = {
+            'ref': 'refs/heads/main-fix',
+            'repository': {'default_branch': 'main', 'owner': {'username': 'unfoldingWord'}},
+            }
+        self.assertEqual(get_queue_names('push', payload_json), ['door43_job_handler'])
+
+    def test_unwanted_event(self):
+        payload_json = {'forkee': {}, 'repository': {'owner': {'username': 'unfoldingWord'}}}
+        self.assertEqual(get_queue_names('fork', payload_json), ['door43_job_handler'])
+
+    def test_excluded_owner(self):
+        payload_json = {'action': 'published', 'repository': {'owner': {'username': 'tx-manager-test-data'}}}
+        self.assertEqual(get_queue_names('release', payload_json), ['door43_job_handler'])
+
+    def test_typical_full_json(self):
+        with open( 'tests/Resources/webhook_post.json', 'rt' ) as json_file:
+            payload_json = json.load(json_file)
+        self.assertEqual(get_queue_names('push', payload_json), ['door43_job_handler'])
+
+    def test_content_changes_only(self):
+        fanout_table = [{**FANOUT_TABLE[0], 'content_changes_only': True}]
+        self.assertEqual(get_fanout_targets(fanout_table, 'push', {'door43_content_changed': False}), [])
+        self.assertEqual(len(get_fanout_targets(fanout_table, 'push', {'door43_content_changed': True})), 1)
+        self.assertEqual(len(get_fanout_targets(fanout_table, 'push', {})), 1) # Couldn't tell
+
+    def test_ignore_content_changes(self):
+        fanout_table = [{**fanout_entry, 'content_changes_only': True} for fanout_entry in FANOUT_TABLE]
+        payload_json = {'ref': 'refs/heads/feature', 'door43_content_changed': False,
+                        'repository': {'owner': {'username': 'someOwner'}, 'default_branch': 'master'}}
+        self.assertEqual(get_fanout_targets(fanout_table, 'push', payload_json), [])
+        self.assertEqual([fanout_entry['queue_name'] for fanout_entry in
+                          get_fanout_targets(fanout_table, 'push', payload_json, ignore_content_changes=True)],
+                         ['door43_job_handler']) # Not the catalog handler on another branch
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from unittest.mock import Mock
+from time import time
+
+from enqueue.job_timeouts import get_percentile, record_job_callback, get_job_timeout, \
+                                    MIN_ADAPTIVE_TIMEOUT_SECONDS, MAX_ADAPTIVE_TIMEOUT_SECONDS
+
+
+class TestJobTimeouts(TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(get_percentile([5], 95), 5)
+        self.assertEqual(get_percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(get_percentile([30, 10, 20], 50), 20)
+
+    def test_not_enough_history(self):
+        mock_connection = Mock(**{'lrange.return_value': [b'100.0']})
+        self.assertEqual(get_job_timeout(mock_connection, 'dev-', 'someOwner/someRepo', '900s'), '900s')
+
+    def test_learned_timeout(self):
+        mock_connection = Mock(**{'lrange.return_value': [b'200.0', b'300.0', b'400.0']})
+        self.assertEqual(get_job_timeout(mock_connection, 'dev-', 'someOwner/someRepo', '900s'), 600)
+
+    def test_clamped_timeouts(self):
+        mock_connection = Mock(**{'lrange.return_value': [b'1.0', b'2.0', b'3.0']})
+        self.assertEqual(get_job_timeout(mock_connection, 'dev-', 'someOwner/someRepo', '900s'), MIN_ADAPTIVE_TIMEOUT_SECONDS)
+        mock_connection = Mock(**{'lrange.return_value': [b'5000.0', b'6000.0', b'7000.0']})
+        self.assertEqual(get_job_timeout(mock_connection, 'dev-', 'someOwner/someRepo', '900s'), MAX_ADAPTIVE_TIMEOUT_SECONDS)
+
+    def test_callback_runtime_is_recorded(self):
+        mock_connection = Mock()
+        runtime_seconds = record_job_callback(mock_connection, 'dev-', 'someOwner/someRepo', time() - 300)
+        self.assertAlmostEqual(runtime_seconds, 300, delta=1)
+        mock_pipeline = mock_connection.pipeline.return_value
+        mock_pipeline.lpush.assert_called_once_with('dev-job_runtimes:someOwner/someRepo', runtime_seconds)
+        mock_pipeline.execute.assert_called_once()
@@ -0,0 +1,111 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+from datetime import datetime, timedelta
+from time import time
+import json
+
+from rq.exceptions import NoSuchJobError
+
+from enqueue.latency_tracker import get_job_ref, record_jobs_enqueued, pop_pending_jobs, get_callback_latencies, \
+                                    PENDING_JOBS_EXPIRY_SECONDS
+
+
+def get_pending_connection(pending_dict, hdel_result=1):
+    """
+    Returns a mock Redis connection holding the given pending jobs hash.
+    """
+    mock_connection = Mock(**{'hgetall.return_value': {field.encode(): json.dumps(pending_jobs).encode()
+                                                        for field, pending_jobs in pending_dict.items()}})
+    mock_connection.pipeline.return_value.execute.return_value = [hdel_result]
+    return mock_connection
+
+
+class TestLatencyTracker(TestCase):
+
+    def test_job_ref(self):
+        self.assertEqual(get_job_ref({'after': '93829a566c4816593923ada57b4cda5da4bc7af1'}),
+                         '93829a566c4816593923ada57b4cda5da4bc7af1')
+        self.assertIsNone(get_job_ref({'action': 'published'}))
+
+    def test_jobs_enqueued(self):
+        mock_connection = Mock()
+        record_jobs_enqueued(mock_connection, 'dev-', 'someOwner/someRepo', 'abc123', 'push', {'someQueue': 'someJobId'})
+        mock_pipeline = mock_connection.pipeline.return_value
+        pending_key, field, pending_json = mock_pipeline.hsetnx.call_args[0]
+        self.assertEqual((pending_key, field), ('dev-pending_jobs:someOwner/someRepo', 'abc123'))
+        pending_jobs = json.loads(pending_json)
+        self.assertEqual(pending_jobs['job_ids'], {'someQueue': 'someJobId'})
+        self.assertEqual(pending_jobs['event_type'], 'push')
+        mock_pipeline.expire.assert_called_once_with(pending_key, PENDING_JOBS_EXPIRY_SECONDS)
+
+    def test_callback_matches_its_commit(self):
+        now = time()
+        mock_connection = get_pending_connection({'93829a566c48': {'event_type': 'push', 'enqueued_at': now - 60, 'job_ids': {}},
+                                                  'ffffffffff48': {'event_type': 'push', 'enqueued_at': now - 5, 'job_ids': {}},
+                                                  })
+        pending_jobs = pop_pending_jobs(mock_connection, 'dev-', 'someOwner/someRepo', 'ffffffffff')
+        self.assertEqual(pending_jobs['enqueued_at'], now - 5)
+        mock_connection.pipeline.return_value.hdel.assert_called_once_with('dev-pending_jobs:someOwner/someRepo', 'ffffffffff48')
+
+    def test_callback_without_commit_gets_earliest(self):
+        now = time()
+        mock_connection = get_pending_connection({'release@2': {'event_type': 'release', 'enqueued_at': now - 5, 'job_ids': {}},
+                                                  'release@1': {'event_type': 'release', 'enqueued_at': now - 60, 'job_ids': {}},
+                                                  '93829a566c48': {'event_type': 'push', 'enqueued_at': now - 90, 'job_ids': {}},
+                                                  })
+        pending_jobs = pop_pending_jobs(mock_connection, 'dev-', 'someOwner/someRepo', None)
+        self.assertEqual(pending_jobs['enqueued_at'], now - 60)
+
+    def test_callback_already_claimed(self):
+        mock_connection = get_pending_connection({'93829a566c48': {'event_type': 'push', 'enqueued_at': time(), 'job_ids': {}}},
+                                                 hdel_result=0)
+        self.assertIsNone(pop_pending_jobs(mock_connection, 'dev-', 'someOwner/someRepo', '93829a566c'))
+        mock_connection = get_pending_connection({})
+        self.assertIsNone(pop_pending_jobs(mock_connection, 'dev-', 'someOwner/someRepo', '93829a566c'))
+        mock_connection.pipeline.assert_not_called()
+
+    def test_stale_jobs_are_removed(self):
+        mock_connection = get_pending_connection({'93829a566c48': {'event_type': 'push',
+                                                                   'enqueued_at': time() - PENDING_JOBS_EXPIRY_SECONDS - 1,
+                                                                   'job_ids': {}}})
+        self.assertIsNone(pop_pending_jobs(mock_connection, 'dev-', 'someOwner/someRepo', '93829a566c'))
+        mock_connection.pipeline.return_value.hdel.assert_called_once_with('dev-pending_jobs:someOwner/someRepo', '93829a566c48')
+
+    def test_rq_job_latencies(self):
+        enqueued_at = datetime.utcnow() - timedelta(seconds=100)
+        mock_job = Mock(enqueued_at=enqueued_at,
+                        started_at=enqueued_at + timedelta(seconds=10),
+                        ended_at=enqueued_at + timedelta(seconds=40))
+        pending_jobs = {'event_type': 'push', 'enqueued_at': time() - 100, 'job_ids': {'someQueue': 'someJobId'}}
+        with patch('enqueue.latency_tracker.Job.fetch', return_value=mock_job) as mock_fetch:
+            latencies = get_callback_latencies(Mock(), pending_jobs, ['someQueue'])
+        mock_fetch.assert_called_once()
+        self.assertEqual(len(latencies), 1)
+        self.assertEqual(latencies[0]['queue_name'], 'someQueue')
+        self.assertAlmostEqual(latencies[0]['turnaround_seconds'], 100, delta=1)
+        self.assertAlmostEqual(latencies[0]['queue_wait_seconds'], 10, delta=0.01)
+        self.assertAlmostEqual(latencies[0]['service_seconds'], 30, delta=0.01)
+
+    def test_expired_rq_job(self):
+        pending_jobs = {'event_type': 'push', 'enqueued_at': time() - 100, 'job_ids': {'someQueue': 'someJobId'}}
+        with patch('enqueue.latency_tracker.Job.fetch', side_effect=NoSuchJobError):
+            latencies = get_callback_latencies(Mock(), pending_jobs, ['someQueue'])
+        self.assertEqual(set(latencies[0]), {'queue_name', 'event_type', 'turnaround_seconds'})
+
+    def test_stream_entry_ids(self):
+        pending_jobs = {'event_type': 'push', 'enqueued_at': time() - 100,
+                        'job_ids': {'someQueue': '1792427248720-0', 'otherQueue': '1792427248720-0'}}
+        with patch('enqueue.latency_tracker.Job.fetch') as mock_fetch:
+            latencies = get_callback_latencies(Mock(), pending_jobs, ['someQueue'])
+        mock_fetch.assert_not_called()
+        self.assertEqual({latency_dict['queue_name'] for latency_dict in latencies}, {'someQueue', 'otherQueue'})
+        self.assertTrue(all('queue_wait_seconds' not in latency_dict for latency_dict in latencies))
+
+    def test_turnaround_only_for_callback_queues(self):
+        pending_jobs = {'event_type': 'push', 'enqueued_at': time() - 100,
+                        'job_ids': {'door43_job_handler': 'someJobId', 'door43_catalog_job_handler': 'otherJobId'}}
+        with patch('enqueue.latency_tracker.Job.fetch', side_effect=NoSuchJobError):
+            latencies = get_callback_latencies(Mock(), pending_jobs, ['door43_job_handler'])
+        latency_dicts = {latency_dict['queue_name']:latency_dict for latency_dict in latencies}
+        self.assertIn('turnaround_seconds', latency_dicts['door43_job_handler'])
+        self.assertNotIn('turnaround_seconds', latency_dicts['door43_catalog_job_handler']) # Catalog jobs send no callback
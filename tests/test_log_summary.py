@@ -0,0 +1,36 @@
+from unittest import TestCase
+import json
+import logging
+
+from enqueue.log_summary import truncate, get_commit_messages_summary, PayloadSummary, DebugSamplingFilter
+
+
+class TestLogSummary(TestCase):
+
+    def test_truncate(self):
+        self.assertEqual(truncate("Update 'test.txt'\n"), "Update 'test.txt'")
+        self.assertEqual(len(truncate('x' * 1000)), 80)
+
+    def test_many_commit_messages(self):
+        payload_json = {'commits': [{'message': f'Commit {n}\n'} for n in range(500)]}
+        self.assertEqual(get_commit_messages_summary(payload_json), '"Commit 0", "Commit 1", "Commit 2", and 497 more')
+
+    def test_typical_full_json(self):
+        with open( 'tests/Resources/webhook_post.json', 'rb' ) as json_file:
+            raw_data = json_file.read()
+        summary_string = str(PayloadSummary('push', json.loads(raw_data), raw_data))
+        self.assertIn('repo=tx-manager-test-data/en-obs-rc-0.2', summary_string)
+        self.assertIn('commits=1', summary_string)
+        self.assertLess(len(summary_string), 500)
+
+    def test_summary_size_is_capped(self):
+        payload_json = {'commits': [{'message': 'x' * 10_000} for _n in range(1000)]}
+        raw_data = json.dumps(payload_json)
+        self.assertLess(len(str(PayloadSummary('push', payload_json, raw_data))), 500)
+
+    def test_debug_sampling(self):
+        debug_record = logging.LogRecord('test', logging.DEBUG, __file__, 1, 'msg', None, None)
+        info_record = logging.LogRecord('test', logging.INFO, __file__, 1, 'msg', None, None)
+        self.assertFalse(DebugSamplingFilter(0).filter(debug_record))
+        self.assertTrue(DebugSamplingFilter(0).filter(info_record))
+        self.assertTrue(DebugSamplingFilter(1).filter(debug_record))
@@ -3,7 +3,8 @@ from unittest.mock import Mock
 import json
 import logging
 
-from enqueue.check_posted_payload import check_posted_payload
+from enqueue.check_posted_payload import check_posted_headers, check_posted_payload, \
+                                            get_changed_filepaths, has_content_changes
 
 
 class TestPayloadCheck(TestCase):
@@ -262,3 +263,104 @@ class TestPayloadCheck(TestCase):
         output = check_posted_payload(mock_request, logging)
         expected = True, payload_json
         self.assertEqual(output, expected)
+
+
+class TestHeaderCheck(TestCase):
+
+    def test_blank(self):
+        mock_request = Mock()
+        mock_request.content_length = 0
+        mock_request.headers = {'X-Gitea-Event':'push'}
+        output = check_posted_headers(mock_request)
+        expected = {
+            'error': "No payload found. You must submit a POST request via a DCS webhook notification."
+        }
+        self.assertEqual(output, expected)
+
+    def test_too_large(self):
+        mock_request = Mock()
+        mock_request.content_length = 999_999_999
+        mock_request.headers = {'X-Gitea-Event':'push'}
+        output = check_posted_headers(mock_request)
+        expected = {
+            'error': "Payload is too large (999,999,999 bytes)."
+        }
+        self.assertEqual(output, expected)
+
+    def test_nagios_ping(self):
+        mock_request = Mock()
+        mock_request.content_length = 10
+        mock_request.headers = {'X-Gitea-Event':'push', 'User-Agent':'check_http/v2.2 (nagios-plugins 2.2.1)'}
+        output = check_posted_headers(mock_request)
+        expected = {
+            'error': "This appears to be a Nagios ping for service availability testing."
+        }
+        self.assertEqual(output, expected)
+
+    def test_missing_header(self):
+        mock_request = Mock()
+        mock_request.content_length = 10
+        mock_request.headers = {'nonEvent':'whatever'}
+        output = check_posted_headers(mock_request)
+        expected = {
+            'error': "This does not appear to be from DCS."
+        }
+        self.assertEqual(output, expected)
+
+    def test_bad_header(self):
+        mock_request = Mock()
+        mock_request.content_length = 10
+        mock_request.headers = {'X-Gitea-Event':'whatever'}
+        output = check_posted_headers(mock_request)
+        self.assertTrue(output['error'].startswith("X-Gitea-Event 'whatever' must be an event of type: "))
+
+    def test_good_headers(self):
+        mock_request = Mock()
+        mock_request.content_length = 10
+        mock_request.headers = {'X-Gitea-Event':'release', 'User-Agent':'GiteaServer'}
+        output = check_posted_headers(mock_request)
+        self.assertIsNone(output)
+
+
+class TestChangeFilter(TestCase):
+
+    def test_unknown_changes(self):
+        self.assertIsNone(get_changed_filepaths({'commits': ['some commit info']}))
+        self.assertIsNone(get_changed_filepaths({'commits': [{'message': 'No file lists'}]}))
+        self.assertIsNone(get_changed_filepaths({'commits': [{'added': ['README.md']}], 'total_commits': 7}))
+
+    def test_combined_changes(self):
+        payload_json = {
+            'commits': [
+                {'added': ['README.md'], 'modified': [], 'removed': []},
+                {'added': [], 'modified': ['.github/workflows/test.yml'], 'removed': ['LICENSE']},
+                ],
+            }
+        changed_filepaths = get_changed_filepaths(payload_json)
+        self.assertEqual(changed_filepaths, {'README.md', '.github/workflows/test.yml', 'LICENSE'})
+        self.assertFalse(has_content_changes(changed_filepaths))
+
+    def test_content_changes(self):
+        self.assertTrue(has_content_changes({'README.md', '01-GEN.usfm'}))
+        self.assertTrue(has_content_changes({'content/README.md'}))
+        self.assertTrue(has_content_changes({'manifest.yaml'}))
+
+    def test_non_content_push(self):
+        headers = {'X-Gitea-Event':'push'}
+        payload_json = {
+            'ref':'refs/heads/master',
+            'before':'c9e49e1e4ffa8a8cacbad8ca56fb29abcd1cc008',
+            'after':'93829a566c4816593923ada57b4cda5da4bc7af1',
+            'repository':{
+                'html_url':'https://git.door43.org/whatever',
+                'default_branch':'master',
+                'private':False,
+                },
+            'commits': [{'message':'Update README', 'added':[], 'modified':['README.md'], 'removed':[]}],
+            }
+        mock_request = Mock(**{'get_json.return_value':payload_json})
+        mock_request.headers = headers
+        mock_request.data = payload_json
+        output_ok_flag, output_payload = check_posted_payload(mock_request, logging)
+        self.assertTrue(output_ok_flag)
+        self.assertIs(output_payload['door43_content_changed'], False)
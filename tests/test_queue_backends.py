@@ -0,0 +1,83 @@
+from unittest import TestCase
+from unittest.mock import Mock
+import json
+
+from redis.exceptions import ResponseError
+
+from enqueue.queue_backends import get_queue_backend, QueueBackend, RqQueueBackend, StreamsQueueBackend
+
+
+QUEUE_JOBS = [{'queue_name': 'door43_job_handler', 'function_name': 'webhook.job', 'job_timeout': '600s'},
+              {'queue_name': 'door43_catalog_job_handler', 'function_name': 'webhook.job', 'job_timeout': '600s'}]
+
+
+class TestQueueBackends(TestCase):
+
+    def test_get_queue_backend(self):
+        self.assertIsInstance(get_queue_backend('rq', 'dev-door43_'), RqQueueBackend)
+        self.assertIsInstance(get_queue_backend('streams', 'dev-door43_'), StreamsQueueBackend)
+        with self.assertRaises(ValueError):
+            get_queue_backend('kafka', 'dev-door43_')
+        with self.assertRaises(TypeError): # Abstract
+            QueueBackend() # pylint: disable=abstract-class-instantiated
+
+    def test_streams_prepare(self):
+        redis_connection = Mock()
+        redis_connection.xgroup_create.side_effect = [None, ResponseError("BUSYGROUP Consumer Group name already exists")]
+        backend = StreamsQueueBackend('door43_')
+        backend.prepare(redis_connection, 'webhook', ['door43_job_handler', 'door43_catalog_job_handler'])
+        redis_connection.xgroup_create.assert_called_with('door43_webhook_stream', 'door43_catalog_job_handler',
+                                                          id='0', mkstream=True)
+        self.assertEqual(backend.queue_stream_names['door43_job_handler'], 'door43_webhook_stream')
+        redis_connection.xgroup_create.side_effect = ResponseError("WRONGTYPE Key is not a stream")
+        with self.assertRaises(ResponseError):
+            backend.prepare(redis_connection, 'webhook', ['door43_job_handler'])
+
+    def test_streams_enqueue_once(self):
+        redis_connection = Mock()
+        redis_connection.xadd.return_value = b'1700000000000-0'
+        backend = StreamsQueueBackend('door43_', max_length=500)
+        backend.prepare(redis_connection, 'webhook', ['door43_job_handler', 'door43_catalog_job_handler'])
+        job_ids = backend.enqueue(redis_connection, 'webhook', QUEUE_JOBS, {'DCS_event': 'push'})
+        self.assertEqual(job_ids, {'door43_job_handler': '1700000000000-0',
+                                   'door43_catalog_job_handler': '1700000000000-0'})
+        redis_connection.xadd.assert_called_once()
+        args, kwargs = redis_connection.xadd.call_args
+        self.assertEqual(args[0], 'door43_webhook_stream')
+        self.assertEqual(json.loads(args[1]['payload']), {'DCS_event': 'push'})
+        self.assertEqual(json.loads(args[1]['targets']), QUEUE_JOBS)
+        self.assertEqual(kwargs, {'maxlen': 500, 'approximate': True, 'nomkstream': True})
+        self.assertEqual(redis_connection.xgroup_create.call_count, 2) # Only when prepared
+
+    def test_streams_groups_created_lazily(self):
+        startup_connection, later_connection = Mock(), Mock()
+        startup_connection.xgroup_create.side_effect = ConnectionError("Shard is down")
+        later_connection.xadd.return_value = b'1700000000000-0'
+        backend = StreamsQueueBackend('door43_')
+        with self.assertRaises(ConnectionError):
+            backend.prepare(startup_connection, 'webhook', ['door43_job_handler', 'door43_catalog_job_handler'])
+        backend.enqueue(later_connection, 'webhook', QUEUE_JOBS, {'DCS_event': 'push'})
+        backend.enqueue(later_connection, 'webhook', QUEUE_JOBS, {'DCS_event': 'push'})
+        self.assertEqual(later_connection.xgroup_create.call_count, 2) # Just once for each group
+        self.assertEqual(later_connection.xadd.call_count, 2)
+
+    def test_streams_missing_stream(self):
+        redis_connection = Mock()
+        redis_connection.xadd.side_effect = [None, b'1700000000000-0'] # e.g., after a restart without persistence
+        backend = StreamsQueueBackend('door43_')
+        backend.prepare(redis_connection, 'webhook', ['door43_job_handler'])
+        job_ids = backend.enqueue(redis_connection, 'webhook', QUEUE_JOBS[:1], {'DCS_event': 'push'})
+        self.assertEqual(job_ids, {'door43_job_handler': '1700000000000-0'})
+        self.assertEqual(redis_connection.xgroup_create.call_count, 2) # At startup and again after the XADD failed
+        redis_connection.xgroup_create.assert_called_with('door43_webhook_stream', 'door43_job_handler', id='0', mkstream=True)
+
+    def test_streams_queue_stats(self):
+        redis_connection = Mock()
+        redis_connection.xinfo_groups.return_value = [
+            {'name': b'door43_catalog_job_handler', 'consumers': 1, 'pending': 0, 'lag': 0},
+            {'name': b'door43_job_handler', 'consumers': 2, 'pending': 1, 'lag': 3}]
+        backend = StreamsQueueBackend('door43_')
+        backend.queue_stream_names['door43_job_handler'] = 'door43_webhook_stream'
+        self.assertEqual(backend.get_queue_length(redis_connection, 'door43_job_handler'), 4)
+        self.assertEqual(backend.get_worker_count(redis_connection, 'door43_job_handler'), 2)
+        self.assertEqual(backend.get_queue_length(redis_connection, 'unknown_queue'), 0)
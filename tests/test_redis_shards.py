@@ -0,0 +1,68 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from redis import exceptions as redis_exceptions
+
+from enqueue.redis_shards import RedisShardRing, get_shard_hostnames, SHARD_CONNECT_TIMEOUT, SHARD_SOCKET_TIMEOUT
+
+
+class TestRedisShards(TestCase):
+
+    def test_default_hostname(self):
+        self.assertEqual(get_shard_hostnames('', 'redis'), ['redis'])
+        self.assertEqual(get_shard_hostnames(' redis1, redis2:6380 ,', 'redis'), ['redis1', 'redis2:6380'])
+
+    def test_single_shard(self):
+        ring = RedisShardRing(['redis'])
+        self.assertEqual(ring.get_shard('tx-manager-test-data/en-obs-rc-0.2').name, 'redis')
+        self.assertEqual(ring.get_shard(None).name, 'redis')
+
+    def test_consistent_owner(self):
+        ring = RedisShardRing(['redis1', 'redis2', 'redis3'])
+        other_ring = RedisShardRing(['redis1', 'redis2', 'redis3'])
+        used_shard_names = set()
+        for repo_number in range(100):
+            repo_name = f'someOwner/someRepo{repo_number}'
+            self.assertEqual(ring.get_shard(repo_name).name, other_ring.get_shard(repo_name).name)
+            self.assertEqual(len(list(ring.get_shards_for_key(repo_name))), 3)
+            used_shard_names.add(ring.get_shard(repo_name).name)
+        self.assertEqual(used_shard_names, {'redis1', 'redis2', 'redis3'})
+
+    def test_failover(self):
+        ring = RedisShardRing(['redis1', 'redis2'])
+        repo_name = 'someOwner/someRepo'
+        owner_shard = ring.get_shard(repo_name)
+        owner_shard.mark_down()
+        self.assertNotEqual(ring.get_shard(repo_name).name, owner_shard.name)
+
+    def test_run_on_shard_failover(self):
+        ring = RedisShardRing(['redis1', 'redis2'])
+        repo_name = 'someOwner/someRepo'
+        owner_shard = ring.get_shard(repo_name)
+        def enqueue_function(redis_connection):
+            if redis_connection is owner_shard.connection:
+                raise redis_exceptions.ConnectionError('Shard is down')
+            return 'queued'
+        used_shard, result = ring.run_on_shard(repo_name, enqueue_function, Mock())
+        self.assertNotEqual(used_shard.name, owner_shard.name)
+        self.assertEqual(result, 'queued')
+        self.assertFalse(owner_shard.is_available())
+
+    def test_socket_timeouts(self):
+        shard = RedisShardRing(['redis1:6380']).shards[0]
+        connection_kwargs = shard.connection.connection_pool.connection_kwargs
+        self.assertEqual(connection_kwargs['port'], 6380)
+        self.assertEqual(connection_kwargs['socket_connect_timeout'], SHARD_CONNECT_TIMEOUT)
+        self.assertEqual(connection_kwargs['socket_timeout'], SHARD_SOCKET_TIMEOUT)
+
+    def test_hung_shard_fails_over(self):
+        ring = RedisShardRing(['redis1', 'redis2'])
+        repo_name = 'someOwner/someRepo'
+        owner_shard = ring.get_shard(repo_name)
+        def enqueue_function(redis_connection):
+            if redis_connection is owner_shard.connection:
+                raise redis_exceptions.TimeoutError('Timeout reading from socket')
+            return 'queued'
+        used_shard, _result = ring.run_on_shard(repo_name, enqueue_function, Mock())
+        self.assertNotEqual(used_shard.name, owner_shard.name)
+        self.assertFalse(owner_shard.is_available())
@@ -0,0 +1,72 @@
+from unittest import TestCase
+from unittest.mock import Mock
+from tempfile import TemporaryDirectory
+import os
+import cProfile
+
+from enqueue.request_profiler import RequestProfiler
+
+
+def busy_function(count):
+    return sum(n * n for n in range(count))
+
+
+class TestRequestProfiler(TestCase):
+
+    def test_disabled_does_not_profile(self):
+        with TemporaryDirectory() as temp_dirpath:
+            profiler = RequestProfiler(sample_rate=0, slow_seconds=0, dirpath=temp_dirpath)
+            get_detail = Mock(return_value='push')
+            profiled_function = profiler.profiled('webhook', get_detail)(busy_function)
+            self.assertEqual(profiled_function(10), 285)
+            get_detail.assert_not_called()
+            self.assertEqual(profiler.group_stats, {})
+            self.assertEqual(os.listdir(temp_dirpath), [])
+
+    def test_profiles_are_grouped_and_summarized(self):
+        with TemporaryDirectory() as temp_dirpath:
+            profiler = RequestProfiler(sample_rate=1, slow_seconds=0, dirpath=temp_dirpath)
+            for event_type in ('push', 'push', 'release'):
+                profiler.profiled('webhook', lambda event_type=event_type: event_type)(busy_function)(1000)
+            self.assertEqual(profiler.group_counts, {'webhook-push': 2, 'webhook-release': 1})
+            summary_dict = profiler.get_summary(top_count=3)
+            self.assertEqual(set(summary_dict), {'webhook-push', 'webhook-release'})
+            hotspots = summary_dict['webhook-push']['hotspots']
+            self.assertLessEqual(len(hotspots), 3)
+            self.assertTrue(any('busy_function' in hotspot['function'] or 'genexpr' in hotspot['function']
+                                for hotspot in hotspots))
+
+    def test_fast_requests_are_dropped(self):
+        with TemporaryDirectory() as temp_dirpath:
+            profiler = RequestProfiler(sample_rate=1, slow_seconds=60, dirpath=temp_dirpath)
+            profiler.profiled('callback', lambda: 'callback')(busy_function)(10)
+            self.assertEqual(profiler.group_stats, {})
+
+    def test_only_one_profile_at_a_time(self):
+        with TemporaryDirectory() as temp_dirpath:
+            profiler = RequestProfiler(sample_rate=1, slow_seconds=0, dirpath=temp_dirpath)
+            with profiler.profiling_lock: # i.e., another request is being profiled
+                self.assertEqual(profiler.profiled('webhook', lambda: 'push')(busy_function)(10), 285)
+            self.assertEqual(profiler.group_stats, {})
+            self.assertEqual(profiler.profiled('webhook', lambda: 'push')(busy_function)(10), 285)
+            self.assertEqual(profiler.group_counts, {'webhook-push': 1})
+
+    def test_profiler_errors_are_contained(self):
+        with TemporaryDirectory() as temp_dirpath:
+            profiler = RequestProfiler(sample_rate=1, slow_seconds=0, dirpath=temp_dirpath)
+            other_profile = cProfile.Profile() # Python 3.12+ won't enable a second one
+            other_profile.enable()
+            try:
+                self.assertEqual(profiler.profiled('webhook', lambda: 'push')(busy_function)(10), 285)
+            finally:
+                other_profile.disable()
+            get_detail = Mock(side_effect=RuntimeError("Broken"))
+            self.assertEqual(profiler.profiled('webhook', get_detail)(busy_function)(10), 285)
+            self.assertFalse(profiler.profiling_lock.locked())
+
+    def test_shared_settings(self):
+        profiler = RequestProfiler(sample_rate=0, slow_seconds=0, dirpath='unused')
+        profiler.get_shared_settings = lambda: {'sample_rate': 5.0, 'slow_seconds': 2.0}
+        profiler.refresh_settings()
+        self.assertEqual(profiler.sample_rate, 1.0) # Clamped
+        self.assertEqual(profiler.slow_seconds, 2.0)